@@ -1,6 +1,7 @@
 """
 正答率分析スクリプト
-各ユーザーの課題モードごとの正答率を集計し、平均正答率を計算する
+各ユーザーの試行を正解マスク（MIP・血管）と比較して自動採点し、課題モードごとに集計する
+（提示条件 .trial.json のない従来の結果は、手入力の correct.csv から正答率を計算する）
 """
 
 import os
@@ -11,6 +12,8 @@ from collections import defaultdict
 from datetime import datetime
 import statistics
 
+from services.scoring_service import score_sessions
+
 
 def find_result_directories(base_dir: str = ".") -> list[Path]:
     """
@@ -186,7 +189,7 @@ def print_results(results: dict):
     print("=" * 80)
 
     for username, user_stats in results.items():
-        if username == "__all_users__":
+        if username in ("__all_users__", "__auto_scores__"):
             continue
 
         print(f"\n{username}:")
@@ -217,13 +220,51 @@ def save_results_json(results: dict, output_path: str):
     print(f"\n結果をJSONファイルに保存しました: {output_path}")
 
 
+def print_auto_scores(sessions: list[dict]):
+    """
+    自動採点の結果（課題モード×正解マスクごとの平均）を表示
+
+    Args:
+        sessions: score_sessions の結果
+    """
+
+    def _fmt(value, scale=1.0, unit=""):
+        return "-" if value is None else f"{value * scale:.1f}{unit}"
+
+    print("\n" + "=" * 80)
+    print("自動採点の結果（hit率 / 網羅率 / 平均距離）")
+    print("=" * 80)
+    for session in sessions:
+        if not session["tasks"]:
+            continue
+        print(f"\n{session['session']}:")
+        print("-" * 80)
+        for t in session["tasks"]:
+            print(
+                f"  {str(t['task']).upper():<8} {t['reference']:<5}"
+                f" 試行数: {t['trials']:>3}"
+                f"  hit率: {_fmt(t['hit_rate_mean'], 100, '%'):>6}"
+                f"  網羅率: {_fmt(t['coverage_mean'], 100, '%'):>6}"
+                f"  平均距離: {_fmt(t['mean_distance_px_mean'], 1, 'px'):>8}"
+            )
+        if session["errors"]:
+            print(f"  採点できなかった試行: {session['errors']}")
+
+
 def main():
     """メイン関数"""
     base_dir = os.path.dirname(os.path.abspath(__file__))
 
     print("正答率の分析を開始します...")
 
+    # 提示条件が保存されている試行を自動採点（セッションごとにプロセスを分けて並列実行）
+    auto_scores = score_sessions(find_result_directories(base_dir))
+    if any(s["tasks"] for s in auto_scores):
+        print_auto_scores(auto_scores)
+
     results = aggregate_all_users(base_dir)
+    if any(s["tasks"] for s in auto_scores):
+        results["__auto_scores__"] = auto_scores
 
     if not results:
         print("分析する結果が見つかりませんでした。")
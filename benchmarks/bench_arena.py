@@ -0,0 +1,105 @@
+"""
+作業バッファ（BufferArena）ベンチマーク
+blend_three を試行ごとに呼び、arena なし/ありで描画時間のばらつき・新規確保数・
+試行ごとの確保量の最大値（tracemalloc で計測。時間とは別の回で測る）を比較する
+
+実行方法（プロジェクト直下で）:
+    python -m benchmarks.bench_arena [試行数] [サイズ]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2 as cv
+import numpy as np
+
+from domain.type import BlendParams, ProcessingConfig
+from process.arena import BufferArena
+from process.blend import blend_three
+
+
+def write_group(out_dir: str, size: int, seed: int = 0) -> tuple[str, str, str]:
+    """ダミーの3画像（背景・MIP・血管）を書き出してパスを返す"""
+    rng = np.random.default_rng(seed)
+    bg = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+    mid = np.zeros((size, size, 3), dtype=np.uint8)
+    cv.circle(mid, (size // 2, size // 2), size // 3, (90, 160, 220), -1)
+    fg = np.zeros((size, size, 3), dtype=np.uint8)
+    for _ in range(20):
+        p0 = tuple(int(v) for v in rng.integers(0, size, 2))
+        p1 = tuple(int(v) for v in rng.integers(0, size, 2))
+        cv.line(fg, p0, p1, (255, 255, 255), 3)
+    paths = tuple(os.path.join(out_dir, n) for n in ("bg.png", "mid.png", "fg.png"))
+    for path, img in zip(paths, (bg, mid, fg)):
+        cv.imwrite(path, img)
+    return paths
+
+
+def run_trials(
+    paths, n_trials: int, arena: BufferArena | None, trace: bool = False
+) -> tuple[list, list]:
+    """n_trials 回描画し、試行ごとの時間(ms)と、新規確保数（trace=True なら
+    試行中に増えたメモリの最大値[bytes]）を返す"""
+    processing = ProcessingConfig(circular_display=True)
+    rng = random.Random(0)
+    times, counts = [], []
+    for _ in range(n_trials):
+        if arena is not None:
+            arena.reset_stats()
+        if trace:
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        blend_three(
+            *paths,
+            BlendParams(alpha_mid=0.3, alpha_fg=0.55),
+            rotation_deg=float(rng.randrange(0, 360, 10)),
+            flip_code=rng.choice([None, 0, 1, -1]),
+            processing=processing,
+            mode_key="task4",
+            arena=arena,
+        )
+        times.append((time.perf_counter() - t0) * 1000.0)
+        if trace:
+            counts.append(tracemalloc.get_traced_memory()[1] - start)
+        elif arena is not None:
+            counts.append(arena.stats().allocations)
+    return times, counts
+
+
+def main():
+    """メイン関数"""
+    n_trials = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 2048
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_group(tmp, size)
+        print(f"trials={n_trials} size={size}x{size}")
+        print(
+            f"{'arena':>6} {'median[ms]':>11} {'p95[ms]':>9} {'max[ms]':>9} "
+            f"{'alloc/trial':>12} {'peak/trial[MB]':>15}"
+        )
+        for use_arena in (False, True):
+            arena = BufferArena() if use_arena else None
+            times, allocations = run_trials(paths, n_trials, arena)
+            # 確保量は tracemalloc を有効にした別の回で測る（時間に影響させない）
+            tracemalloc.start()
+            try:
+                _, peaks = run_trials(paths, n_trials, arena, trace=True)
+            finally:
+                tracemalloc.stop()
+            steady = times[1:] or times  # 初回（読み込み・表の生成）は除く
+            alloc = f"{np.mean(allocations[1:] or allocations):.1f}" if arena else "-"
+            peak = np.median(peaks[1:] or peaks) / 1024 / 1024
+            print(
+                f"{str(use_arena):>6} {np.median(steady):>11.1f} "
+                f"{np.percentile(steady, 95):>9.1f} {max(steady):>9.1f} "
+                f"{alloc:>12} {peak:>15.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+asset pack ベンチマーク
+パックあり/なしで blend_three の結果が画素単位で一致することを確認し、
+グループの読み込み時間（PNGのデコード vs np.memmap のスライス）を比較する
+
+実行方法（プロジェクト直下で）:
+    python -m benchmarks.bench_asset_pack [サイズ] [反復回数]
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import replace
+
+import cv2 as cv
+import numpy as np
+
+from domain.type import BlendParams, ProcessingConfig
+from process.blend import blend_three, get_decoded_cache, load_group
+from services.batch_service import build_asset_pack
+
+# (回転, 反転, 円形表示, transform_last, 表示サイズ)
+CASES = [
+    (0.0, None, True, False, None),
+    (30.0, 1, True, False, None),
+    (30.0, -1, False, False, None),
+    (120.0, 0, True, True, None),
+    (50.0, None, False, False, (640, 480)),
+]
+
+
+def write_group(group_dir: str, size: int, seed: int) -> tuple[str, str, str]:
+    """ダミーの3画像（背景・MIP・血管）を書き出してパスを返す。
+    MIP・血管は背景と違うサイズにして、読み込み時のサイズ合わせも通す。
+    """
+    os.makedirs(group_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    bg = rng.integers(0, 256, (size, size * 4 // 3, 3), dtype=np.uint8)
+    mid = np.zeros((size // 2, size // 2, 3), dtype=np.uint8)
+    cv.circle(mid, (size // 4, size // 4), size // 6, (90, 160, 220), -1)
+    fg = np.zeros((size + 17, size + 5, 3), dtype=np.uint8)
+    for _ in range(20):
+        p0 = tuple(int(v) for v in rng.integers(0, size, 2))
+        p1 = tuple(int(v) for v in rng.integers(0, size, 2))
+        cv.line(fg, p0, p1, (255, 255, 255), 2)
+    paths = tuple(
+        os.path.join(group_dir, n) for n in ("bg.png", "mip.png", "vein.png")
+    )
+    for path, img in zip(paths, (bg, mid, fg)):
+        cv.imwrite(path, img)
+    return paths
+
+
+def render(paths, processing: ProcessingConfig, case) -> np.ndarray:
+    rotation, flip, circular, transform_last, target_size = case
+    processing = replace(
+        processing,
+        circular_display=circular,
+        transform_last=transform_last,
+        render_at_display_size=target_size is not None,
+    )
+    return blend_three(
+        *paths,
+        BlendParams(alpha_mid=0.3, alpha_fg=0.55),
+        rotation_deg=rotation,
+        flip_code=flip,
+        processing=processing,
+        mode_key="task4",
+        target_size=target_size,
+    )
+
+
+def main():
+    """メイン関数"""
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    n_iter = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    with tempfile.TemporaryDirectory() as tmp:
+        assets = os.path.join(tmp, "assets")
+        groups = [
+            write_group(os.path.join(assets, f"g{i}"), size, seed=i) for i in range(3)
+        ]
+        # 背景サイズの違うグループ（パックされず、PNGから読まれる）
+        groups.append(write_group(os.path.join(assets, "other"), size // 2, seed=9))
+        pack_dir = os.path.join(tmp, "pack")
+        _, packed, skipped = build_asset_pack(pack_dir, assets_root=assets)
+        print(f"size={size} packed={packed} skipped={skipped}")
+
+        # 一致確認（パックなしの出力と画素単位で比較）
+        loose = ProcessingConfig()
+        with_pack = ProcessingConfig(asset_pack_dir=pack_dir)
+        for paths in groups:
+            for case in CASES:
+                get_decoded_cache().clear()
+                ref = render(paths, loose, case)
+                get_decoded_cache().clear()
+                out = render(paths, with_pack, case)
+                if ref.shape != out.shape or not np.array_equal(ref, out):
+                    raise SystemExit(f"mismatch: group={paths[0]} case={case}")
+        print(f"identical with and without the pack for {len(CASES)} cases")
+
+        # 読み込み時間（デコード済みキャッシュを空にした状態から）
+        paths = groups[0]
+        full = (size * 4 // 3, size)
+        for name, processing, load_size in (
+            ("png", loose, None),
+            ("pack", with_pack, full),
+        ):
+            times = []
+            for _ in range(n_iter):
+                get_decoded_cache().clear()
+                t0 = time.perf_counter()
+                imgs = load_group(*paths, size=load_size, processing=processing)
+                for img in imgs:
+                    np.asarray(img).sum()  # memmap のページを実際に読む
+                times.append((time.perf_counter() - t0) * 1000.0)
+            print(f"{name:>5} load_group median {statistics.median(times):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+レイヤーグラフ合成（render_layered）ベンチマーク
+同じグラフで入力を1つずつ変えながら描画し、変更の種類ごとに作り直したノード・段と
+描画時間を表示する。各段階の結果は、毎回すべてのレイヤーを作り直す合成
+（prepare_layers → composite_layers → finish_output）と画素単位で一致するかも確認する
+
+実行方法（プロジェクト直下で）:
+    python -m benchmarks.bench_compositor [サイズ]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from dataclasses import replace
+
+import cv2 as cv
+import numpy as np
+
+from benchmarks.bench_arena import write_group
+from domain.type import BlendParams, ProcessingConfig
+from process.blend import (
+    blend_three,
+    build_blend_graph,
+    composite_layers,
+    finish_output,
+    output_clip_mask,
+    output_regions,
+    prepare_layers,
+    render_layered,
+)
+
+# (説明, 前の段階からの変更)。変更は inputs の辞書へ上書きする
+STEPS = [
+    ("initial", {}),
+    ("alpha_fg", {"alpha_fg": 0.8}),
+    ("alpha_mid", {"alpha_mid": 0.6}),
+    ("colormap", {"mip_colormap_override": cv.COLORMAP_HOT}),
+    ("rotation", {"rotation_deg": 45.0}),
+    ("flip", {"flip_code": 1}),
+    ("vein asset", {"fg": 1}),
+    ("hue", {"hue_for_bg": 20}),
+    ("circular off", {"circular_display": False}),
+    ("sparse", {"sparse_compositing": True}),
+    ("packed masks", {"packed_mask_cache": True}),
+    ("task1", {"mode_key": "task1"}),
+    ("task2", {"mode_key": "task2"}),
+    ("transform_last", {"mode_key": "task4", "transform_last": True}),
+    ("display size", {"target_size": (320, 240)}),
+    ("alpha_fg", {"alpha_fg": 0.2}),
+]
+PROCESSING_FIELDS = (
+    "hue_for_bg",
+    "circular_display",
+    "sparse_compositing",
+    "packed_mask_cache",
+    "transform_last",
+)
+
+
+def reference(paths, inputs: dict, processing: ProcessingConfig) -> np.ndarray:
+    """グラフを使わずに合成した結果（transform_last は正規向きの合成結果のキャッシュ経由、
+    それ以外はすべてのレイヤーを作り直して合成する）
+    """
+    params = BlendParams(inputs["alpha_mid"], inputs["alpha_fg"])
+    kwargs = dict(
+        rotation_deg=inputs["rotation_deg"],
+        flip_code=inputs["flip_code"],
+        processing=processing,
+        mode_key=inputs["mode_key"],
+        mip_colormap_override=inputs["mip_colormap_override"],
+        target_size=inputs["target_size"],
+    )
+    if processing.transform_last:
+        return blend_three(*paths, params, **kwargs)
+    layers = prepare_layers(*paths, **kwargs)
+    out = composite_layers(
+        layers,
+        params,
+        output_regions(layers, processing),
+        sparse=processing.sparse_compositing,
+        clip_mask=output_clip_mask(layers, processing),
+    )
+    return finish_output(
+        out,
+        processing,
+        rotation_deg=inputs["rotation_deg"],
+        flip_code=inputs["flip_code"],
+    )
+
+
+def main():
+    """メイン関数"""
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 2048
+    with tempfile.TemporaryDirectory() as tmp:
+        groups = []
+        for i in range(2):
+            os.makedirs(os.path.join(tmp, f"g{i}"))
+            groups.append(write_group(os.path.join(tmp, f"g{i}"), size, seed=i))
+        graph = build_blend_graph()
+        inputs = {
+            "fg": 0,
+            "alpha_mid": 0.3,
+            "alpha_fg": 0.55,
+            "rotation_deg": 0.0,
+            "flip_code": None,
+            "mode_key": "task4",
+            "mip_colormap_override": None,
+            "target_size": None,
+        }
+        processing = ProcessingConfig()
+        print(f"size={size}x{size}")
+        print(f"{'change':>15} {'graph[ms]':>10} {'full[ms]':>9}  rebuilt")
+        for name, change in STEPS:
+            inputs.update(change)
+            processing = replace(
+                processing,
+                **{k: v for k, v in change.items() if k in PROCESSING_FIELDS},
+            )
+            paths = groups[0][:2] + (groups[inputs["fg"]][2],)
+
+            t0 = time.perf_counter()
+            out = render_layered(
+                *paths,
+                BlendParams(inputs["alpha_mid"], inputs["alpha_fg"]),
+                rotation_deg=inputs["rotation_deg"],
+                flip_code=inputs["flip_code"],
+                processing=processing,
+                mode_key=inputs["mode_key"],
+                mip_colormap_override=inputs["mip_colormap_override"],
+                target_size=inputs["target_size"],
+                graph=graph,
+            )
+            graph_ms = (time.perf_counter() - t0) * 1000.0
+            rebuilt = ", ".join(graph.last_recomputed)
+
+            t0 = time.perf_counter()
+            ref = reference(paths, inputs, processing)
+            full_ms = (time.perf_counter() - t0) * 1000.0
+            if ref.shape != out.shape or not np.array_equal(ref, out):
+                raise SystemExit(f"mismatch after '{name}'")
+            print(f"{name:>15} {graph_ms:>10.1f} {full_ms:>9.1f}  {rebuilt}")
+        print(f"identical to a full rebuild for all {len(STEPS)} steps")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+IR→肌色変換ベンチマーク
+従来のHSV画像生成＋cvtColorと、HSVTransformer（V→BGR対応表）を比較する
+
+実行方法（プロジェクト直下で）:
+    python -m benchmarks.bench_hsv_lut
+"""
+
+import time
+
+import cv2 as cv
+import numpy as np
+
+from process.HSV_trans import HSVTransformer
+
+
+# 1000 は行末の端数列（SIMDで割り切れない列）がある幅
+SIZES = [1000, 1024, 2048, 4096]
+REPEAT = 10
+
+
+def legacy_convert(ir_frame: np.ndarray, hue: int, saturation: int) -> np.ndarray:
+    """対応表導入前の変換手順（HSV画像を作って cvtColor）"""
+    height, width = ir_frame.shape
+    hsv_image = np.zeros((height, width, 3), dtype=np.uint8)
+    hsv_image[:, :, 0] = hue
+    hsv_image[:, :, 1] = saturation
+    hsv_image[:, :, 2] = ir_frame
+    return cv.cvtColor(hsv_image, cv.COLOR_HSV2BGR)
+
+
+def best_of(fn, *args) -> tuple[float, np.ndarray]:
+    """REPEAT回実行し、最短時間(ms)と最後の結果を返す"""
+    best = float("inf")
+    result = None
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0, result
+
+
+def main():
+    """メイン関数"""
+    hue, saturation = 15, 140
+    tf = HSVTransformer(hue=hue, saturation=saturation)
+    rng = np.random.default_rng(0)
+    print(f"{'size':>6} {'cvtColor[ms]':>13} {'LUT[ms]':>10} {'speedup':>8} {'identical':>10}")
+    for size in SIZES:
+        ir = rng.integers(0, 256, (size, size), dtype=np.uint8)
+        # 対応表の生成を計測から除外するため1回ウォームアップ
+        tf.convert_ir_to_skin_color(ir)
+        t_legacy, out_legacy = best_of(legacy_convert, ir, hue, saturation)
+        t_lut, out_lut = best_of(tf.convert_ir_to_skin_color, ir)
+        identical = bool(np.array_equal(out_legacy, out_lut))
+        print(
+            f"{size:>6} {t_legacy:>13.1f} {t_lut:>10.1f} "
+            f"{t_legacy / t_lut:>7.2f}x {str(identical):>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
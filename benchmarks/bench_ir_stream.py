@@ -0,0 +1,38 @@
+"""
+IRフレーム列変換ベンチマーク
+IRStreamConverter の持続フレームレートをワーカー数ごとに計測する
+
+実行方法（プロジェクト直下で）:
+    python -m benchmarks.bench_ir_stream [フレーム数] [サイズ]
+"""
+
+import os
+import sys
+
+import numpy as np
+
+from process.HSV_trans import HSVTransformer, IRStreamConverter
+
+
+def main():
+    """メイン関数"""
+    n_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    rng = np.random.default_rng(0)
+    # N×H×W のIRスタック
+    stack = rng.integers(0, 256, (n_frames, size, size), dtype=np.uint8)
+    tf = HSVTransformer(hue=15, saturation=140)
+
+    print(f"frames={n_frames} size={size}x{size} cpus={os.cpu_count()}")
+    print(f"{'workers':>8} {'fps':>10} {'elapsed[s]':>11}")
+    for workers in sorted({1, 2, 4, os.cpu_count() or 1}):
+        converter = IRStreamConverter(tf, workers=workers)
+        checksum = 0
+        for frame in converter.convert(stack):
+            checksum += int(frame[0, 0, 0])
+        st = converter.stats()
+        print(f"{workers:>8} {st.fps:>10.1f} {st.elapsed_s:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+from array import array
 from dataclasses import dataclass, field
 import cv2 as cv
 
@@ -28,6 +29,29 @@ class ProcessingConfig:
     # 円形表示設定
     circular_display: bool = True  # 円形表示を有効化
     circular_bg_color: tuple = (34, 34, 34)  # 円の外側の背景色 (B, G, R)
+    # 描画パイプライン設定
+    # True: 正規向きで合成した結果をキャッシュし、最後に反転＋回転を1回だけ適用
+    transform_last: bool = False
+    # True: 元解像度ではなく表示（キャンバス）サイズで描画する（入力を先に縮小）
+    render_at_display_size: bool = False
+    # True: マスクの非0画素を含むタイル範囲だけを合成する（細い血管マスク向け）
+    sparse_compositing: bool = False
+    # True: マスクを素材ごとに1回だけ作り、ビットパックして保持する
+    # （回転後のマスクは正規向きマスクを回転して得る）
+    packed_mask_cache: bool = False
+    # ビットパック済みマスクの保存先（Noneならメモリのみ）
+    mask_cache_dir: str | None = None
+    # True: 背景(IR)とMIPを IMREAD_UNCHANGED で読み、16bit/floatは読み込み時に1回だけ
+    # 8bitへ正規化する（正規化済みの画像をキャッシュ）
+    high_bit_depth: bool = False
+    # 正規化の窓 (下限, 上限)（元データの値）。Noneなら画像ごとの最小〜最大
+    ir_window: tuple[float, float] | None = None
+    mip_window: tuple[float, float] | None = None
+    # 2以上: 画素ごとの段を横帯に分けてこのスレッド数で並列に処理する（大きな画像向け）
+    tile_workers: int = 1
+    # asset pack（pack_assets.py で作成）のディレクトリ。指定するとパック内のグループは
+    # PNGをデコードせず、パックの正規化サイズの配列（np.memmap のスライス）を使う
+    asset_pack_dir: str | None = None
 
 
 @dataclass
@@ -63,6 +87,31 @@ class Stroke:
     rotation: float = 0.0
 
 
+# 試行中の全ストロークの記録（点ごとの座標・時刻・ストローク番号）
+@dataclass(slots=True)
+class StrokeLog:
+    x: array = field(default_factory=lambda: array("f"))
+    y: array = field(default_factory=lambda: array("f"))
+    t_ns: array = field(default_factory=lambda: array("q"))  # time.perf_counter_ns()
+    stroke_id: array = field(default_factory=lambda: array("I"))  # 点が属するストローク
+    colors: list[str] = field(default_factory=list)  # ストロークごとの色
+    widths: list[int] = field(default_factory=list)  # ストロークごとの太さ
+    t0_ns: int = 0  # 試行開始（次へ押下）の時刻
+
+
+# 試行の提示条件（Servicesで選択し、UIへ渡す）
+@dataclass(frozen=True)
+class TrialSpec:
+    bg_path: str
+    mid_path: str
+    fg_path: str
+    flip_code: int | None  # 反転指定（None, 0 上下, 1 左右, -1 両方）
+    rotation_deg: float
+    ui_mode_key: str | None  # UIで選択中の課題モード
+    internal_mode: str | None  # 実際に使用する内部タスク
+    mip_colormap_override: int | None = None
+
+
 # 計測レコード（単一描画モード用）
 @dataclass
 class TimingRecord:
@@ -75,6 +124,65 @@ class SessionMetrics:
     drawing: TimingRecord  # 単一の描画計測
 
 
+# キャッシュ統計（Processのキャッシュが報告し、Services/UIが参照）
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    bytes_used: int = 0
+    max_bytes: int = 0
+
+
+# フレーム列変換の統計（Processが報告）
+@dataclass
+class StreamStats:
+    frames: int = 0
+    elapsed_s: float = 0.0
+    fps: float = 0.0  # 持続フレームレート（frames / elapsed_s）
+
+
+# 先読み描画の統計（Servicesが報告し、UIが参照）
+@dataclass
+class PrerenderStats:
+    queue_depth: int = 0  # 先読み済み（または描画中）の試行数
+    max_depth: int = 0
+    hits: int = 0  # 先読み結果をそのまま使えた回数
+    misses: int = 0  # 同期描画になった回数
+    discarded: int = 0  # 条件変更で破棄した先読み結果の数
+
+
+# 次の画像グループの先読みデコードの統計（Servicesが報告）
+@dataclass
+class PrefetchStats:
+    hits: int = 0  # 試行開始時にデコードが終わっていた回数
+    misses: int = 0  # 先読みがない、またはデコード完了を待った回数
+    discarded: int = 0  # 使わずに捨てた先読みの数
+    last_decode_ms: float | None = None  # 直近の先読みデコードにかかった時間
+    mean_decode_ms: float | None = None
+
+
+# 作業バッファ（BufferArena）の統計（Processが報告し、Servicesが試行ごとに参照）
+@dataclass
+class ArenaStats:
+    allocations: int = 0  # 直近のリセット以降に新規確保したバッファ数
+    reuses: int = 0  # 既存バッファを再利用した回数
+    buffers: int = 0  # 保持しているバッファ数
+    bytes_held: int = 0
+    peak_bytes: int | None = None  # reset_stats() 以降の確保量の最大値（tracemalloc 有効時のみ）
+
+
+# 描画（マーキング）と正解マスクの比較結果（Processが計算し、Servicesが集計）
+@dataclass
+class MarkingScore:
+    marked_px: int = 0  # 描画した画素数
+    reference_px: int = 0  # 正解マスクの画素数
+    hit_rate: float | None = None  # 描画画素のうち正解から許容距離以内の割合
+    coverage: float | None = None  # 正解画素のうち描画から許容距離以内の割合
+    mean_distance_px: float | None = None  # 描画画素から正解までの平均距離
+
+
 # 保存規則（Domain層で定義し、Services層で利用）
 @dataclass
 class SaveRule:
@@ -82,6 +190,10 @@ class SaveRule:
     dir_format: str = "{username}_{date}"
     # ファイル名の書式: {time} (HHMMSSfff), 拡張子はServices側で決定
     file_format: str = "image_{time}.png"
+    # 画像と並べて保存するファイル（画像の拡張子をこれに置き換える）
+    mask_suffix: str = ".mask.png"  # マーキングマスク
+    stroke_log_suffix: str = ".strokes.npz"  # ストロークログ
+    trial_info_suffix: str = ".trial.json"  # 提示条件（自動採点用）
 
 
 # Assets構成（Domainで規定し、Servicesで参照・実体パス解決）
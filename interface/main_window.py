@@ -1,19 +1,24 @@
 import os
+import time
 import tkinter as tk
 from tkinter import messagebox, simpledialog
 from PIL import Image, ImageTk
-import random
 
 from services.ui_actions import (
+    activate_trial,
     browse_path,
     blend_and_get_image,
+    reblend_last,
+    reblend_preview,
     resize_for_canvas,
     save_with_canvas,
     append_metrics_for_image,
 )
-from services.asset_service import pick_random_group
+from services.asset_service import pick_random_group, refresh_catalog
 from services.metrix_service import MetricsService
-from domain.type import Stroke, DrawingConfig
+from services.stroke_service import StrokeRecorder, log_to_strokes
+from services.trial_service import TrialPrerenderer
+from domain.type import StrokeLog, DrawingConfig, TrialSpec
 from services.config_service import DEFAULT_DRAWING_CONFIG, DEFAULT_MODES_CONFIG
 from services.user_service import set_current_user
 
@@ -55,6 +60,9 @@ class MainWindow(tk.Tk):
         self.rotation_angle = 0.0  # 現在の回転角度（度）
         self.rotation_step = 10.0  # 次へで回す角度ステップ（度）
         self.flip_code: int | None = None  # 反転指定（None, 0 上下, 1 左右, -1 両方）
+        self.current_trial: TrialSpec | None = None  # 表示中の試行の提示条件
+        # 次の試行の先読み描画（描画中にワーカースレッドで用意しておく）
+        self.prerenderer = TrialPrerenderer(depth=1)
 
         # 計測トラッカー（servicesへ委譲）
         self.metrics = MetricsService()
@@ -62,8 +70,9 @@ class MainWindow(tk.Tk):
         # 描画設定と状態
         self.drawing_config: DrawingConfig = DEFAULT_DRAWING_CONFIG
         self.current_draw_color = None
-        self.last_xy = None
-        self.drawn_items = []  # キャンバスに描いたラインIDの管理
+        self.strokes = StrokeRecorder()  # ストロークの点列（キャンバス座標）
+        self.stroke_items = []  # ストロークごとの折れ線アイテムID
+        self._active_item = None  # 描画中のストロークの折れ線アイテムID
         # 課題モード設定
         self.modes_config = DEFAULT_MODES_CONFIG
         self.current_mode_key: str | None = None
@@ -124,7 +133,7 @@ class MainWindow(tk.Tk):
 
         tk.Label(params_frame, text="alpha_mid").grid(row=0, column=0, sticky=tk.W)
         self.alpha_mid = tk.DoubleVar(value=0.3)
-        tk.Scale(
+        scale_mid = tk.Scale(
             params_frame,
             from_=0.0,
             to=1.0,
@@ -132,11 +141,14 @@ class MainWindow(tk.Tk):
             orient=tk.HORIZONTAL,
             variable=self.alpha_mid,
             length=100,
-        ).grid(row=0, column=1, padx=4)
+            command=self._on_alpha_drag,
+        )
+        scale_mid.grid(row=0, column=1, padx=4)
+        scale_mid.bind("<ButtonRelease-1>", self._on_alpha_commit)
 
         tk.Label(params_frame, text="alpha_fg").grid(row=1, column=0, sticky=tk.W)
         self.alpha_fg = tk.DoubleVar(value=0.3)
-        tk.Scale(
+        scale_fg = tk.Scale(
             params_frame,
             from_=0.0,
             to=1.0,
@@ -144,7 +156,10 @@ class MainWindow(tk.Tk):
             orient=tk.HORIZONTAL,
             variable=self.alpha_fg,
             length=100,
-        ).grid(row=1, column=1, padx=4)
+            command=self._on_alpha_drag,
+        )
+        scale_fg.grid(row=1, column=1, padx=4)
+        scale_fg.bind("<ButtonRelease-1>", self._on_alpha_commit)
 
         # 円形表示切り替えボタン（右ペイン内）
         display_frame = tk.LabelFrame(right, text="表示設定")
@@ -226,21 +241,27 @@ class MainWindow(tk.Tk):
         mid = self.mid_var.get().strip()
         fg = self.fg_var.get().strip()
         try:
-            # UIで選択された課題モードに対応する内部タスクを取得（固定マッピング）
-            from services.config_service import get_internal_task_mode
-
-            internal_mode = get_internal_task_mode(self.current_mode_key)
-
-            # 内部モードに応じたMIPカラーマップ上書き
-            spec = None
-            if internal_mode and hasattr(self, "modes_config"):
-                for s in self.modes_config.modes:
-                    if s.key == internal_mode:
-                        spec = s
-                        break
-            mip_override = (
-                getattr(spec, "mip_colormap_override", None) if spec else None
-            )
+            trial = self.current_trial
+            if trial is not None and trial.ui_mode_key == self.current_mode_key:
+                # 表示中の試行と同じ内部タスクで描き直す
+                internal_mode = trial.internal_mode
+                mip_override = trial.mip_colormap_override
+            else:
+                # UIで選択された課題モードに対応する内部タスクを取得（固定マッピング）
+                from services.config_service import get_internal_task_mode
+
+                internal_mode = get_internal_task_mode(self.current_mode_key)
+
+                # 内部モードに応じたMIPカラーマップ上書き
+                spec = None
+                if internal_mode and hasattr(self, "modes_config"):
+                    for s in self.modes_config.modes:
+                        if s.key == internal_mode:
+                            spec = s
+                            break
+                mip_override = (
+                    getattr(spec, "mip_colormap_override", None) if spec else None
+                )
 
             self.result_image = blend_and_get_image(
                 bg,
@@ -252,38 +273,106 @@ class MainWindow(tk.Tk):
                 flip_code=self.flip_code,
                 mode_key=internal_mode,  # 固定された内部タスクを使用
                 mip_colormap_override=mip_override,
+                target_size=self._canvas_size(),
             )
             self._show_image(self.result_image)
         except Exception as e:
             messagebox.showerror("処理失敗", str(e))
 
+    def _on_alpha_drag(self, _value=None):
+        """スライダー操作中: 表示解像度のキャッシュ済みレイヤーから再合成して即時表示"""
+        if self.result_image is None:
+            return
+        canvas_w, canvas_h = self._canvas_size()
+        try:
+            preview = reblend_preview(
+                float(self.alpha_mid.get()),
+                float(self.alpha_fg.get()),
+                canvas_w,
+                canvas_h,
+            )
+        except Exception:
+            return
+        if preview is not None:
+            self._show_image(preview)
+
+    def _on_alpha_commit(self, _event=None):
+        """スライダー確定時: 元解像度で再合成して保存対象の画像を更新"""
+        if self.result_image is None:
+            return
+        try:
+            image = reblend_last(float(self.alpha_mid.get()), float(self.alpha_fg.get()))
+        except Exception as e:
+            messagebox.showerror("処理失敗", str(e))
+            return
+        if image is not None:
+            self.result_image = image
+            self._show_image(self.result_image)
+
     def _on_next(self):
-        # 画像グループをランダムに選択
+        # 計測（次へ押下）。先読みがなく同期描画になる場合も描画時間を含めて計る
+        t0_ns = time.perf_counter_ns()
+        self.metrics.start_task(t0_ns)
+        # ストロークログの時刻も同じ起点にする（クリアしても変わらない）
+        self.strokes.start_trial(t0_ns)
+        # 次の試行（画像グループ・反転・回転を選択済み）を取得。先読み済みなら差し替えるだけ
+        rendered = None
+        error = None
         try:
-            self.bg_path, self.mid_path, self.fg_path = pick_random_group()
+            rendered = self.prerenderer.take(
+                self.current_mode_key,
+                float(self.alpha_mid.get()),
+                float(self.alpha_fg.get()),
+                fallback_paths=(self.bg_path, self.mid_path, self.fg_path),
+                target_size=self._canvas_size(),
+            )
+            trial = rendered.spec
+            self.current_trial = trial
+            self.bg_path, self.mid_path, self.fg_path = (
+                trial.bg_path,
+                trial.mid_path,
+                trial.fg_path,
+            )
             self.bg_var.set(self.bg_path)
             self.mid_var.set(self.mid_path)
             self.fg_var.set(self.fg_path)
-        except Exception:
-            pass
-        # 反転（なし/上下/左右/両方）をランダムに選択
-        self.flip_code = random.choice([None, 0, 1, -1])
-        # 回転角度をランダムに（10度刻み）選択して再ブレンド
-        candidates = list(range(0, 360, 10))
-        self.rotation_angle = float(random.choice(candidates))
-        # 計測（次へ押下）
-        self.metrics.start_task()
+            self.flip_code = trial.flip_code
+            self.rotation_angle = trial.rotation_deg
+        except Exception as e:
+            error = e
         # 次へ実行時は描画モードを有効化（強制設定）
         self.current_draw_color = self.drawing_config.line_color
         self._update_draw_button(active=True)
         # 既存の手描きラインをクリア
         self._on_clear()
-        self._on_blend()
+        if rendered is None:
+            messagebox.showerror("処理失敗", str(error))
+            return
+        self.result_image = activate_trial(rendered)
+        self._show_image(self.result_image)
+        # 表示中に次の試行を先読み
+        self.after_idle(self._fill_prerender)
 
-    def _show_image(self, pil_img: Image.Image):
-        # キャンバスに収まるよう簡易リサイズ
+    def _fill_prerender(self):
+        try:
+            self.prerenderer.fill(
+                self.current_mode_key,
+                float(self.alpha_mid.get()),
+                float(self.alpha_fg.get()),
+                fallback_paths=(self.bg_path, self.mid_path, self.fg_path),
+                target_size=self._canvas_size(),
+            )
+        except Exception:
+            pass
+
+    def _canvas_size(self) -> tuple[int, int]:
         canvas_w = int(self.canvas["width"]) if self.canvas["width"] else 1280
         canvas_h = int(self.canvas["height"]) if self.canvas["height"] else 760
+        return canvas_w, canvas_h
+
+    def _show_image(self, pil_img: Image.Image):
+        # キャンバスに収まるよう簡易リサイズ
+        canvas_w, canvas_h = self._canvas_size()
         pil_img = resize_for_canvas(pil_img, canvas_w, canvas_h)
         self.display_image = pil_img
         self.photo = ImageTk.PhotoImage(pil_img)
@@ -299,11 +388,16 @@ class MainWindow(tk.Tk):
             messagebox.showinfo("保存", "まず重畳して表示してください。")
             return
         # キャンバス描画を画像座標へ変換してServicesへ委譲
-        strokes = self._collect_strokes()
+        stroke_log = self._collect_stroke_log()
         base_img = (
             self.display_image if self.display_image is not None else self.result_image
         )
-        path = save_with_canvas(base_img, strokes, mode_key=self.current_mode_key)
+        path = save_with_canvas(
+            base_img,
+            log_to_strokes(stroke_log),
+            mode_key=self.current_mode_key,
+            stroke_log=stroke_log,
+        )
         if path:
             # 計測CSVへ追記（モードごとに1行）
             try:
@@ -337,7 +431,7 @@ class MainWindow(tk.Tk):
         if self.current_draw_color:
             # 描画モードを停止
             self.current_draw_color = None
-            self.last_xy = None
+            self.strokes.end()
             self._update_draw_button(active=False)
         else:
             # 描画モードを開始
@@ -358,39 +452,46 @@ class MainWindow(tk.Tk):
             return
         # 計測（開始点）
         self.metrics.on_canvas_down()
-        self.last_xy = (event.x, event.y)
+        self.strokes.begin(
+            event.x, event.y, self.current_draw_color, self.drawing_config.line_width
+        )
+        self._active_item = None
 
     def _on_canvas_move(self, event):
-        if not self.current_draw_color or self.last_xy is None:
+        if not self.current_draw_color:
             return
-        x0, y0 = self.last_xy
-        x1, y1 = event.x, event.y
-        item_id = self.canvas.create_line(
-            x0,
-            y0,
-            x1,
-            y1,
-            fill=self.current_draw_color,
-            width=self.drawing_config.line_width,
-            capstyle=tk.ROUND,
-            smooth=True,
-        )
-        self.drawn_items.append(item_id)
-        self.last_xy = (x1, y1)
+        coords = self.strokes.extend(event.x, event.y)
+        if coords is None:
+            return
+        # 1ストロークにつき折れ線アイテムは1つ（2点目で作り、以降は座標を更新）
+        if self._active_item is None:
+            self._active_item = self.canvas.create_line(
+                *coords,
+                fill=self.current_draw_color,
+                width=self.drawing_config.line_width,
+                capstyle=tk.ROUND,
+                joinstyle=tk.ROUND,
+            )
+            self.stroke_items.append(self._active_item)
+        else:
+            self.canvas.coords(self._active_item, coords)
 
     def _on_canvas_up(self, event):
         # 計測（ストローク終了）
         self.metrics.on_canvas_up()
-        self.last_xy = None
+        self.strokes.end()
+        self._active_item = None
 
     def _on_clear(self):
         # 画像アイテム以外（記録しているライン）を削除
-        for item_id in self.drawn_items:
+        for item_id in self.stroke_items:
             try:
                 self.canvas.delete(item_id)
             except Exception:
                 pass
-        self.drawn_items.clear()
+        self.stroke_items.clear()
+        self.strokes.clear()
+        self._active_item = None
 
     # --- 課題選択 ---
     def _select_mode(self, key: str):
@@ -399,6 +500,11 @@ class MainWindow(tk.Tk):
         if key not in self.mode_counts:
             self.mode_counts[key] = 0
         self._update_task_buttons()
+        # assetsの追加・削除はモード切替時に反映する（試行中はカタログを参照するだけ）
+        try:
+            refresh_catalog()
+        except Exception:
+            pass
         # 進捗UI更新
         self._update_progress_ui()
         # モード変更＋ on_next と同等のランダム切替・計測開始・クリア・再ブレンドを実施
@@ -446,7 +552,7 @@ class MainWindow(tk.Tk):
         # 画像を再ブレンドして表示
         self._on_blend()
 
-    def _collect_strokes(self) -> list[Stroke]:
+    def _collect_stroke_log(self) -> StrokeLog:
         # Canvasの画像中心座標と表示サイズから画像の左上（原点）を推定
         try:
             cx, cy = self.canvas.coords(self.canvas_img_id)
@@ -457,28 +563,8 @@ class MainWindow(tk.Tk):
         x0 = int(cx - img_w / 2)
         y0 = int(cy - img_h / 2)
 
-        strokes: list[Stroke] = []
-        for item_id in self.drawn_items:
-            coords = self.canvas.coords(item_id)
-            if not coords or len(coords) < 4:
-                continue
-            pts = []
-            for i in range(0, len(coords), 2):
-                px = coords[i] - x0
-                py = coords[i + 1] - y0
-                pts.append((px, py))
-            color = self.canvas.itemcget(item_id, "fill") or "#FF0000"
-            width_str = self.canvas.itemcget(item_id, "width")
-            try:
-                width = (
-                    int(float(width_str))
-                    if width_str
-                    else self.drawing_config.line_width
-                )
-            except Exception:
-                width = self.drawing_config.line_width
-            strokes.append(Stroke(points=pts, color=color, width=width))
-        return strokes
+        # 点列は記録済みなので Tk から読み戻さない
+        return self.strokes.to_log(origin=(x0, y0))
 
 
 def run():
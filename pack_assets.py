@@ -0,0 +1,49 @@
+"""
+asset pack 作成スクリプト
+背景が同じサイズの assets のグループを、元解像度のまま uint8 配列1つ（groups.npy）と
+索引（index.json）にまとめる（サイズの違うグループは除き、PNGから読む）。
+ProcessingConfig.asset_pack_dir に出力先を指定すると、描画時はPNGをデコードせず
+np.memmap のスライスを使う（描画結果はパックがない場合と同じ）
+
+実行方法（プロジェクト直下で）:
+    python pack_assets.py [--out 出力先] [--width 幅 --height 高さ]
+"""
+
+import argparse
+import os
+import time
+
+from services.batch_service import build_asset_pack
+
+
+def main():
+    """メイン関数"""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="assets を asset pack にまとめる")
+    parser.add_argument("--assets", default=None, help="assetsルート（既定: ./assets）")
+    parser.add_argument(
+        "--out", default=os.path.join(base_dir, "asset_pack"), help="出力ディレクトリ"
+    )
+    parser.add_argument(
+        "--width", type=int, default=None, help="パックする背景の幅（既定: 最も多いサイズ）"
+    )
+    parser.add_argument(
+        "--height", type=int, default=None, help="パックする背景の高さ"
+    )
+    args = parser.parse_args()
+
+    size = None
+    if args.width and args.height:
+        size = (args.width, args.height)
+    t0 = time.perf_counter()
+    index_path, count, skipped = build_asset_pack(
+        args.out, size=size, assets_root=args.assets
+    )
+    print(f"{count} グループをパックしました（{time.perf_counter() - t0:.1f} 秒）")
+    if skipped:
+        print(f"背景サイズの違う {skipped} グループはパックしていません（PNGから読みます）")
+    print(f"索引: {index_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,95 @@
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Iterable, Iterator
+
 import cv2 as cv
 import numpy as np
 
+from domain.type import StreamStats
+
+
+class ValueLUT:
+    """8bit値(V) → BGR の対応表。
+
+    OpenCV の色変換は各行の大部分をSIMDで、行末の端数列をスカラーで計算し、
+    両者は±1ずれることがある。そのため「本体列用」と「行末列用」の2つの表と
+    行末列の開始位置を持ち、全画面の cvtColor とビット単位で一致させる。
+    """
+
+    def __init__(self, body: np.ndarray, tail: np.ndarray, tail_start: int):
+        self.body = body
+        self.tail = tail
+        self.tail_start = tail_start
+        # チャンネルごとの 256 要素の表（1ch の cv.LUT は3ch表の LUT より速い）
+        self._body_planes = [np.ascontiguousarray(body[:, c]) for c in range(3)]
+
+    @classmethod
+    def from_probe(cls, probe: np.ndarray) -> "ValueLUT | None":
+        """probe: 行 v に値 v を並べた (256, W) 画像を変換した結果 (256, W, 3)。
+        列ごとの結果が「本体」「行末」の2通りに分かれない場合は None。
+        """
+        width = probe.shape[1]
+        body = np.ascontiguousarray(probe[:, 0])
+        tail = np.ascontiguousarray(probe[:, -1])
+        same_as_body = (probe == body[:, None, :]).all(axis=(0, 2))
+        tail_start = width if same_as_body.all() else int(np.argmin(same_as_body))
+        if not same_as_body[:tail_start].all():
+            return None
+        if not (probe[:, tail_start:] == tail[:, None, :]).all():
+            return None
+        body.flags.writeable = False
+        tail.flags.writeable = False
+        return cls(body, tail, tail_start)
+
+    def apply(self, values: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        """(H, W) uint8 → (H, W, 3) uint8"""
+        # B/G/R をそれぞれ1chの表引きで求めて、出力先へ merge する
+        planes = [cv.LUT(values, plane) for plane in self._body_planes]
+        out = cv.merge(planes, dst=out)
+        if self.tail_start < values.shape[1]:
+            out[:, self.tail_start :] = np.take(
+                self.tail, values[:, self.tail_start :], axis=0
+            )
+        return out
+
+
+def value_probe(width: int) -> np.ndarray:
+    """行 v に値 v を並べた (256, width) の uint8 画像"""
+    return np.repeat(np.arange(256, dtype=np.uint8)[:, None], width, axis=1)
+
+
+def hsv_to_bgr_with_value(v: np.ndarray, hue: int, saturation: int) -> np.ndarray:
+    """H/Sを固定し、Vに v を入れたHSV画像をBGRへ変換する（従来の変換手順そのもの）"""
+    hsv = np.empty(v.shape + (3,), dtype=np.uint8)
+    hsv[:, :, 0] = hue
+    hsv[:, :, 1] = saturation
+    hsv[:, :, 2] = v
+    return cv.cvtColor(hsv, cv.COLOR_HSV2BGR)
+
+
+@lru_cache(maxsize=64)
+def hsv_value_lut(hue: int, saturation: int, width: int) -> ValueLUT | None:
+    """H/Sを固定したときの V → BGR 対応表（幅 width の画像用）。
+    全画素でH/Sが一定ならBGR出力はVと列位置（本体/行末）だけで決まる。
+    """
+    probe = hsv_to_bgr_with_value(value_probe(width), hue, saturation)
+    return ValueLUT.from_probe(probe)
+
+
+@lru_cache(maxsize=64)
+def retint_value_lut(
+    hue: int, saturation: int, tint_hue: int, tint_saturation: int, width: int
+) -> ValueLUT | None:
+    """IR値 → 肌色(hue, saturation) → HSVのVを取り出し → (tint_hue, tint_saturation) で再着色、
+    という2段の色空間変換をまとめた V → BGR 対応表（幅 width の画像用）。
+    """
+    skin = hsv_to_bgr_with_value(value_probe(width), hue, saturation)
+    skin_v = cv.cvtColor(skin, cv.COLOR_BGR2HSV)[:, :, 2]
+    probe = hsv_to_bgr_with_value(skin_v, tint_hue, tint_saturation)
+    return ValueLUT.from_probe(probe)
+
 
 class HSVTransformer:
     def __init__(self, hue: int = 15, saturation: int = 100):
@@ -23,16 +112,22 @@ class HSVTransformer:
             self.saturation = int(np.clip(saturation, 0, 255))
 
     def convert_ir_to_skin_color(
-        self, ir_frame, hue: int | None = None, saturation: int | None = None
+        self,
+        ir_frame,
+        hue: int | None = None,
+        saturation: int | None = None,
+        out: np.ndarray | None = None,
     ):
         """
         赤外フレーム（グレースケール）を肌色のカラー画像に変換
         HSV色空間を使用してH(色相)とS(彩度)を肌色に設定し、V(明度)に赤外画像を適用
+        （H/Sごとに作るV→BGRの対応表を引く。HSV画像を作って cvtColor するのと同一の結果）
 
         Args:
             ir_frame: 赤外フレーム（グレースケール画像）
             hue: 色相 (0-179)。未指定(None)ならインスタンス既定値 self.hue を使用
             saturation: 彩度 (0-255)。未指定(None)なら self.saturation を使用
+            out: 出力先 (H, W, 3) uint8。Noneなら新規確保
 
         Returns:
             skin_colored_frame: 肌色に変換されたBGR画像
@@ -53,22 +148,150 @@ class HSVTransformer:
             np.clip(self.saturation if saturation is None else saturation, 0, 255)
         )
 
-        # 画像サイズを取得
-        height, width = ir_frame.shape
+        # H/S固定のため、V(赤外画像の明度)から BGR への対応表を引くだけでよい
+        lut = hsv_value_lut(use_h, use_s, ir_frame.shape[1])
+        if lut is None:
+            # 対応表で再現できない環境では従来どおりHSV画像を変換する
+            skin_colored_frame = hsv_to_bgr_with_value(ir_frame, use_h, use_s)
+            if out is not None:
+                np.copyto(out, skin_colored_frame)
+                return out
+            return skin_colored_frame
+        skin_colored_frame = lut.apply(ir_frame, out=out)
+
+        return skin_colored_frame
+
+    def convert_ir_to_tint_color(
+        self,
+        ir_frame,
+        tint_hue: int,
+        tint_saturation: int,
+        out: np.ndarray | None = None,
+    ):
+        """
+        赤外フレームを肌色に変換した画像の明度(V)を保ったまま、H/Sを差し替えた画像を返す
+        （convert_ir_to_skin_color の結果を BGR→HSV→H/S置換→BGR するのと同一の結果を、
+        対応表1回で得る）
+
+        Args:
+            ir_frame: 赤外フレーム（グレースケール画像）
+            tint_hue: 差し替える色相 (0-179)
+            tint_saturation: 差し替える彩度 (0-255)
+            out: 出力先 (H, W, 3) uint8。Noneなら新規確保
+
+        Returns:
+            tinted_frame: 再着色したBGR画像
+        """
+        if ir_frame is None:
+            raise ValueError("ir_frame is None")
+        if ir_frame.ndim == 3:
+            ir_frame = cv.cvtColor(ir_frame, cv.COLOR_BGR2GRAY)
+        if ir_frame.dtype != np.uint8:
+            ir_frame = cv.normalize(ir_frame, None, 0, 255, cv.NORM_MINMAX).astype(
+                np.uint8
+            )
+        use_th = int(np.clip(tint_hue, 0, 179))
+        use_ts = int(np.clip(tint_saturation, 0, 255))
+        lut = retint_value_lut(
+            self.hue, self.saturation, use_th, use_ts, ir_frame.shape[1]
+        )
+        if lut is None:
+            # 対応表で再現できない環境では従来どおり2回の色空間変換を行う
+            skin = self.convert_ir_to_skin_color(ir_frame)
+            skin_v = cv.cvtColor(skin, cv.COLOR_BGR2HSV)[:, :, 2]
+            tinted_frame = hsv_to_bgr_with_value(skin_v, use_th, use_ts)
+            if out is not None:
+                np.copyto(out, tinted_frame)
+                return out
+            return tinted_frame
+        return lut.apply(ir_frame, out=out)
+
 
-        # HSV画像を作成
-        hsv_image = np.zeros((height, width, 3), dtype=np.uint8)
+def iter_video_frames(path: str) -> Iterator[np.ndarray]:
+    """動画ファイル（録画したIR映像など）をグレースケールのフレーム列として返す"""
+    cap = cv.VideoCapture(path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"動画を開けませんでした: {path}")
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            if frame.ndim == 3:
+                frame = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
+            yield frame
+    finally:
+        cap.release()
 
-        # H(色相)チャンネル: 肌色 (15前後がベージュ/肌色)
-        hsv_image[:, :, 0] = use_h
 
-        # S(彩度)チャンネル: 適度な彩度
-        hsv_image[:, :, 1] = use_s
+class IRStreamConverter:
+    """IRフレーム列（動画・カメラ・N×H×W配列）を肌色へ連続変換する。
 
-        # V(明度)チャンネル: 赤外画像の明度をそのまま使用
-        hsv_image[:, :, 2] = ir_frame
+    出力は事前確保したリングバッファへ書き込み、フレームごとの確保を行わない。
+    workers > 1 ならスレッドプールで並列に変換する（OpenCVの処理中はGILが解放される）。
+    yield された配列は次のフレームを要求するまで有効。保持する場合はコピーすること。
+    """
 
-        # HSVからBGRに変換
-        skin_colored_frame = cv.cvtColor(hsv_image, cv.COLOR_HSV2BGR)
+    def __init__(self, transformer: HSVTransformer | None = None, workers: int = 1):
+        self.transformer = transformer if transformer is not None else HSVTransformer()
+        self.workers = max(1, int(workers))
+        self._buffers: list[np.ndarray] = []
+        self._frames = 0
+        self._elapsed_s = 0.0
 
-        return skin_colored_frame
+    def _ensure_buffers(self, shape: tuple[int, int]) -> None:
+        # 変換中: workers 枚、利用者が参照中: 1枚、次の投入先: 1枚
+        count = self.workers + 2
+        if len(self._buffers) == count and self._buffers[0].shape[:2] == shape:
+            return
+        self._buffers = [np.empty(shape + (3,), dtype=np.uint8) for _ in range(count)]
+
+    def convert(
+        self,
+        frames: Iterable[np.ndarray] | np.ndarray,
+        hue: int | None = None,
+        saturation: int | None = None,
+    ) -> Iterator[np.ndarray]:
+        """フレーム列（またはN×H×W配列）を順に変換して返すジェネレータ"""
+        self._frames = 0
+        self._elapsed_s = 0.0
+        convert = self.transformer.convert_ir_to_skin_color
+        t0 = time.perf_counter()
+        if self.workers == 1:
+            for i, frame in enumerate(frames):
+                self._ensure_buffers(frame.shape[:2])
+                out = self._buffers[i % len(self._buffers)]
+                yield convert(frame, hue, saturation, out=out)
+                self._frames += 1
+                self._elapsed_s = time.perf_counter() - t0
+            return
+
+        pending: deque = deque()
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="ir-stream"
+        ) as pool:
+            for i, frame in enumerate(frames):
+                if pending and pending[0][1].shape[:2] != frame.shape[:2]:
+                    # サイズが変わる前に変換中のフレームをすべて返す
+                    while pending:
+                        yield self._finish(pending.popleft()[0], t0)
+                self._ensure_buffers(frame.shape[:2])
+                out = self._buffers[i % len(self._buffers)]
+                pending.append(
+                    (pool.submit(convert, frame, hue, saturation, out=out), out)
+                )
+                if len(pending) >= self.workers:
+                    yield self._finish(pending.popleft()[0], t0)
+            while pending:
+                yield self._finish(pending.popleft()[0], t0)
+
+    def _finish(self, future, t0: float) -> np.ndarray:
+        result = future.result()
+        self._frames += 1
+        self._elapsed_s = time.perf_counter() - t0
+        return result
+
+    def stats(self) -> StreamStats:
+        """直近の convert() の処理フレーム数・経過時間・持続フレームレート"""
+        fps = self._frames / self._elapsed_s if self._elapsed_s > 0 else 0.0
+        return StreamStats(frames=self._frames, elapsed_s=self._elapsed_s, fps=fps)
@@ -0,0 +1,62 @@
+import tracemalloc
+
+import numpy as np
+
+from domain.type import ArenaStats
+
+
+class BufferArena:
+    """パイプラインの作業バッファを名前ごとに保持して使い回す。
+
+    get() は同じ名前・形状・dtype なら前回のバッファを返し、異なる場合だけ確保し直す。
+    作業解像度が変わらない限り、2回目以降の試行では新規確保が起きない。
+    スレッド間で共有しないこと（スレッドごとに1つ持つ）。
+    arena のバッファに書かれた結果は、次に同じ arena を使う呼び出しで上書きされる。
+    tracemalloc が有効なとき（python -X tracemalloc など）は、reset_stats() 以降に
+    増えたメモリの最大値も報告する（ピークはプロセス全体で1つなので、他スレッドの
+    描画と重なった場合はその分も含む）。
+    """
+
+    def __init__(self):
+        self._buffers: dict[str, np.ndarray] = {}
+        self._allocations = 0
+        self._reuses = 0
+        self._traced_start: int | None = None
+
+    def get(
+        self, name: str, shape: tuple[int, ...], dtype=np.uint8
+    ) -> np.ndarray:
+        """名前 name の作業バッファ（内容は不定）を返す。"""
+        shape = tuple(int(n) for n in shape)
+        dtype = np.dtype(dtype)
+        buf = self._buffers.get(name)
+        if buf is not None and buf.shape == shape and buf.dtype == dtype:
+            self._reuses += 1
+            return buf
+        buf = np.empty(shape, dtype=dtype)
+        self._buffers[name] = buf
+        self._allocations += 1
+        return buf
+
+    def reset_stats(self) -> None:
+        self._allocations = 0
+        self._reuses = 0
+        self._traced_start = None
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            self._traced_start = tracemalloc.get_traced_memory()[0]
+
+    def clear(self) -> None:
+        self._buffers.clear()
+
+    def stats(self) -> ArenaStats:
+        peak = None
+        if self._traced_start is not None and tracemalloc.is_tracing():
+            peak = max(0, tracemalloc.get_traced_memory()[1] - self._traced_start)
+        return ArenaStats(
+            allocations=self._allocations,
+            reuses=self._reuses,
+            buffers=len(self._buffers),
+            bytes_held=sum(int(b.nbytes) for b in self._buffers.values()),
+            peak_bytes=peak,
+        )
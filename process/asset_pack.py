@@ -0,0 +1,124 @@
+import json
+import os
+from typing import Callable
+
+import numpy as np
+
+from process.image_cache import file_key
+
+
+PACK_ARRAY_NAME = "groups.npy"
+PACK_INDEX_NAME = "index.json"
+# 2: 元解像度で格納（1 は指定サイズへ縮小していたため読まない）
+PACK_VERSION = 2
+
+# (bg, mid, fg) のパスから、背景サイズにそろえた3画像を返す関数（load_group）
+GroupLoader = Callable[
+    [tuple[str, str, str]], tuple[np.ndarray, np.ndarray, np.ndarray]
+]
+
+
+def _group_key(paths: tuple[str, str, str]) -> tuple[str, str, str]:
+    return tuple(os.path.abspath(p) for p in paths)
+
+
+def write_pack(
+    groups: list[tuple[str, str, str]],
+    pack_dir: str,
+    size: tuple[int, int],
+    load: GroupLoader,
+) -> str:
+    """画像グループを1つの uint8 配列 (グループ数, 3, 高さ, 幅, 3) と JSON の索引に書き出す。
+
+    各グループは load(paths) の結果（load_group で size を指定しない場合と同じ、
+    元解像度の画素）をそのまま格納する。背景が size (幅, 高さ) でないグループは
+    ValueError にする（呼び出し側で除いておく）。索引には素材ファイルの同一性（file_key）を
+    記録し、差し替えられた素材は開くときに対象外にする。戻り値は索引ファイルのパス。
+    """
+    os.makedirs(pack_dir, exist_ok=True)
+    width, height = int(size[0]), int(size[1])
+    array_path = os.path.join(pack_dir, PACK_ARRAY_NAME)
+    data = np.lib.format.open_memmap(
+        array_path, mode="w+", dtype=np.uint8, shape=(len(groups), 3, height, width, 3)
+    )
+    entries = []
+    for i, paths in enumerate(groups):
+        for role, img in enumerate(load(paths)):
+            if img.shape != (height, width, 3):
+                raise ValueError(
+                    f"パックのサイズ {width}x{height} と異なる画像です: {paths[role]}"
+                )
+            data[i, role] = img
+        entries.append(
+            {
+                "paths": list(_group_key(paths)),
+                "keys": [list(file_key(p)[1:]) for p in paths],
+            }
+        )
+    data.flush()
+    del data
+
+    index_path = os.path.join(pack_dir, PACK_INDEX_NAME)
+    index = {
+        "version": PACK_VERSION,
+        "array": PACK_ARRAY_NAME,
+        "size": [width, height],
+        "groups": entries,
+    }
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    return index_path
+
+
+class AssetPack:
+    """write_pack で作ったパックを np.memmap（読み取り専用）で開いたもの。
+
+    group() は配列のスライス（複製なし）を返すため、開いただけでは画素は読み込まれず、
+    触れたグループのページだけがOSのページキャッシュに載る。
+    開くときに各素材の file_key を確認し、索引作成後に差し替えられたグループは使わない。
+    """
+
+    def __init__(self, pack_dir: str):
+        with open(os.path.join(pack_dir, PACK_INDEX_NAME), encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") != PACK_VERSION:
+            raise ValueError(
+                f"対応していないパック形式です（pack_assets.py で作り直してください）: {pack_dir}"
+            )
+        self.pack_dir = pack_dir
+        self.size: tuple[int, int] = tuple(index["size"])
+        self._data = np.load(os.path.join(pack_dir, index["array"]), mmap_mode="r")
+        self._slots: dict[tuple[str, str, str], int] = {}
+        self._backgrounds: set[str] = set()
+        self.stale = 0
+        for i, entry in enumerate(index["groups"]):
+            paths = tuple(entry["paths"])
+            try:
+                current = [list(file_key(p)[1:]) for p in paths]
+            except OSError:
+                current = None
+            if current == entry["keys"]:
+                self._slots[paths] = i
+                self._backgrounds.add(paths[0])
+            else:
+                self.stale += 1
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, paths: tuple[str, str, str]) -> bool:
+        return _group_key(paths) in self._slots
+
+    def covers(self, bg_path: str) -> bool:
+        """bg_path を背景とするグループがパックにあるか"""
+        return os.path.abspath(bg_path) in self._backgrounds
+
+    def group(
+        self, paths: tuple[str, str, str]
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray] | None:
+        """(bg, mid, fg) の3画像（パック内のビュー、書き込み不可）。なければ None。"""
+        slot = self._slots.get(_group_key(paths))
+        if slot is None:
+            return None
+        arr = np.asarray(self._data[slot])
+        return arr[0], arr[1], arr[2]
@@ -1,13 +1,47 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable
+
 import cv2 as cv
 import numpy as np
 
 from process.HSV_trans import HSVTransformer
+from process.arena import BufferArena
+from process.asset_pack import AssetPack
+from process.compositor import GraphNode, LayerGraph, OverlaySpec
+from process.image_cache import ArrayLRUCache, file_key
+from process.mask_cache import PackedMaskCache
 from domain.type import (
     BlendParams,
+    CacheStats,
     ProcessingConfig,
 )
 
 
+# デコード済み画像のキャッシュ（パス＋更新時刻＋サイズをキーとする）
+_decoded_cache = ArrayLRUCache()
+# 正規向き（反転・回転前）の合成結果のキャッシュ（transform_last モード用）
+_composite_cache = ArrayLRUCache(max_bytes=256 * 1024 * 1024)
+# 正規向きで生成したレイヤー（CLAHE＋カラーマップ済みMIPなど）のキャッシュ
+_layer_cache = ArrayLRUCache(max_bytes=256 * 1024 * 1024)
+# 素材ごとの二値マスク（ビットパック）のキャッシュ
+_mask_cache = PackedMaskCache()
+# 横帯並列（tile_workers）用のスレッドプール（初回にCPUコア数で作成し、作り直さない）
+_tile_pool: ThreadPoolExecutor | None = None
+_TILE_POOL_SIZE = os.cpu_count() or 1
+_tile_pool_lock = threading.Lock()
+# 開いた asset pack（ディレクトリごとに1つ）
+_asset_packs: dict[str, AssetPack] = {}
+_asset_packs_lock = threading.Lock()
+# CLAHEインスタンスはスレッドごとに1つを使い回す（先読みスレッドと共有しない）
+_clahe_local = threading.local()
+# blend_three のレイヤーグラフもスレッドごとに1つ持ち、呼び出しをまたいで使い回す
+_graph_local = threading.local()
+
+
 def read_color(path: str) -> np.ndarray:
     img = cv.imread(path, cv.IMREAD_COLOR)
     if img is None:
@@ -15,14 +49,236 @@ def read_color(path: str) -> np.ndarray:
     return img
 
 
+def normalize_to_u8(
+    img: np.ndarray, window: tuple[float, float] | None = None
+) -> np.ndarray:
+    """16bit/float の画像を 8bit へ正規化する（uint8 はそのまま返す）。
+
+    Args:
+        img: 入力画像
+        window: (下限, 上限)。下限以下を0、上限以上を255に割り当てる。
+            Noneなら画像の最小〜最大（従来の NORM_MINMAX と同じ）
+    """
+    if img.dtype == np.uint8:
+        return img
+    if window is None:
+        return cv.normalize(img, None, 0, 255, cv.NORM_MINMAX).astype(np.uint8)
+    lo, hi = float(window[0]), float(window[1])
+    scale = 255.0 / (hi - lo) if hi > lo else 0.0
+    scaled = img.astype(np.float32)
+    np.nan_to_num(scaled, copy=False)
+    scaled -= lo
+    scaled *= scale
+    np.clip(scaled, 0, 255, out=scaled)
+    return scaled.astype(np.uint8)
+
+
+def read_unchanged_u8(
+    path: str, window: tuple[float, float] | None = None
+) -> np.ndarray:
+    """IMREAD_UNCHANGED で読み、normalize_to_u8 で 8bit BGR の作業用画像にする。
+    IMREAD_COLOR は16bitを上位8bitに切り詰めるため、スキャナ出力の階調を窓で選べない。
+    """
+    img = cv.imread(path, cv.IMREAD_UNCHANGED)
+    if img is None:
+        raise FileNotFoundError(f"画像を読み込めませんでした: {path}")
+    if img.ndim == 3 and img.shape[2] == 4:
+        img = img[:, :, :3]
+    img = normalize_to_u8(img, window)
+    if img.ndim == 2:
+        img = cv.cvtColor(img, cv.COLOR_GRAY2BGR)
+    return np.ascontiguousarray(img)
+
+
+def source_variant(processing: ProcessingConfig | None, role: str) -> tuple | None:
+    """素材の読み込み方（キャッシュキーの一部）。role は "ir" / "mip" / "vein"。
+    None は従来どおり IMREAD_COLOR で読むことを表す。
+    """
+    if processing is None or not processing.high_bit_depth or role == "vein":
+        return None
+    window = processing.ir_window if role == "ir" else processing.mip_window
+    return ("unchanged", None if window is None else tuple(window))
+
+
+def read_color_cached(path: str, variant: tuple | None = None) -> np.ndarray:
+    """read_color のキャッシュ版。返す配列は書き込み不可（共有されるため）。
+    variant（source_variant の値）を指定すると IMREAD_UNCHANGED で読み、窓で正規化する。
+    """
+    try:
+        key = file_key(path)
+    except OSError:
+        raise FileNotFoundError(f"画像を読み込めませんでした: {path}")
+    if variant is None:
+        return _decoded_cache.get_or_create(key, lambda: read_color(path))
+    return _decoded_cache.get_or_create(
+        (variant, key), lambda: read_unchanged_u8(path, variant[1])
+    )
+
+
+def read_color_resized(
+    path: str, size: tuple[int, int], variant: tuple | None = None
+) -> np.ndarray:
+    """read_color_cached を指定サイズ (幅, 高さ) へ縮小したもの（縮小結果もキャッシュする）。"""
+    img = read_color_cached(path, variant)
+    if (img.shape[1], img.shape[0]) == tuple(size):
+        return img
+    key = ("resized", file_key(path), tuple(size))
+    if variant is not None:
+        key += (variant,)
+    return _decoded_cache.get_or_create(
+        key, lambda: cv.resize(img, tuple(size), interpolation=cv.INTER_AREA)
+    )
+
+
+def get_asset_pack(pack_dir: str) -> AssetPack:
+    """pack_dir の asset pack を開いて返す（2回目以降は開いたものを使う）"""
+    with _asset_packs_lock:
+        pack = _asset_packs.get(pack_dir)
+        if pack is None:
+            pack = AssetPack(pack_dir)
+            _asset_packs[pack_dir] = pack
+        return pack
+
+
+def _active_pack(processing: ProcessingConfig | None) -> AssetPack | None:
+    """processing で使う asset pack（なければ None）。
+    パックは IMREAD_COLOR で読んだ画素なので、high_bit_depth では使わない。
+    """
+    if processing is None or processing.asset_pack_dir is None:
+        return None
+    if source_variant(processing, "ir") is not None:
+        return None
+    return get_asset_pack(processing.asset_pack_dir)
+
+
+def read_color_fitted(
+    path: str, ref: np.ndarray, variant: tuple | None = None
+) -> np.ndarray:
+    """read_color_cached を ref と同じサイズに ensure_size したもの（結果もキャッシュする）。"""
+    img = read_color_cached(path, variant)
+    if img.shape[:2] == ref.shape[:2]:
+        return img
+    key = ("fitted", file_key(path), ref.shape[:2])
+    if variant is not None:
+        key += (variant,)
+    return _decoded_cache.get_or_create(key, lambda: ensure_size(ref, img))
+
+
+def load_group(
+    bg_path: str,
+    mid_path: str,
+    fg_path: str,
+    size: tuple[int, int] | None = None,
+    processing: ProcessingConfig | None = None,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """3画像を読み込み、bgのサイズ（sizeを指定した場合はそのサイズ）に揃えて返す。
+    processing.high_bit_depth が有効なら背景とMIPは正規化済みの8bit作業用画像を使う。
+    processing.asset_pack_dir のパックにあるグループで size がパックのサイズ（元解像度）と
+    同じなら、デコードせずパックのビューを返す（size なしで読み込んだ場合と同じ画素）。
+    """
+    pack = _active_pack(processing)
+    if pack is not None and size is not None and tuple(size) == pack.size:
+        group = pack.group((bg_path, mid_path, fg_path))
+        if group is not None:
+            return group
+    variants = [source_variant(processing, r) for r in ("ir", "mip", "vein")]
+    if size is None:
+        bg = read_color_cached(bg_path, variants[0])
+        mid = read_color_fitted(mid_path, bg, variants[1])
+        fg = read_color_fitted(fg_path, bg, variants[2])
+        return bg, mid, fg
+    bg = read_color_resized(bg_path, size, variants[0])
+    mid = read_color_resized(mid_path, size, variants[1])
+    fg = read_color_resized(fg_path, size, variants[2])
+    return bg, mid, fg
+
+
+def group_working_size(
+    bg_path: str,
+    processing: ProcessingConfig,
+    rotation_deg: float = 0.0,
+    target_size: tuple[int, int] | None = None,
+) -> tuple[int, int] | None:
+    """表示サイズ target_size に対するグループの作業解像度（縮小不要なら None）。
+    asset pack にあるグループは縮小不要ならパックのサイズ（元解像度）を返す。
+    """
+    pack = _active_pack(processing)
+    full_size = pack.size if pack is not None and pack.covers(bg_path) else None
+    if target_size is None:
+        return full_size
+    if full_size is None:
+        bg = read_color_cached(bg_path, source_variant(processing, "ir"))
+        width, height = bg.shape[1], bg.shape[0]
+    else:
+        width, height = full_size
+    size = working_size(
+        width,
+        height,
+        target_size,
+        rotation_deg=rotation_deg,
+        keep_size=processing.circular_display,
+    )
+    return full_size if size is None else size
+
+
+def get_decoded_cache() -> ArrayLRUCache:
+    return _decoded_cache
+
+
+def get_decoded_cache_stats() -> CacheStats:
+    return _decoded_cache.stats()
+
+
 def ensure_size(ref: np.ndarray, other: np.ndarray) -> np.ndarray:
     if ref.shape[:2] == other.shape[:2]:
         return other
     return cv.resize(other, (ref.shape[1], ref.shape[0]))
 
 
+def rotated_size(width: int, height: int, angle_deg: float) -> tuple[int, int]:
+    """rotate_image(keep_size=False) の出力サイズ (幅, 高さ)"""
+    if not angle_deg:
+        return width, height
+    mat = cv.getRotationMatrix2D((width / 2.0, height / 2.0), angle_deg, 1.0)
+    c, s = abs(mat[0, 0]), abs(mat[0, 1])
+    return int(height * s + width * c), int(height * c + width * s)
+
+
+def working_size(
+    width: int,
+    height: int,
+    target_size: tuple[int, int] | None,
+    rotation_deg: float = 0.0,
+    keep_size: bool = True,
+) -> tuple[int, int] | None:
+    """回転後の出力が target_size (幅, 高さ) に収まる作業解像度 (幅, 高さ) を返す。
+    縮小の必要がなければ None（元解像度のまま処理する）。
+    """
+    if target_size is None:
+        return None
+    out_w, out_h = (
+        (width, height) if keep_size else rotated_size(width, height, rotation_deg)
+    )
+    scale = min(target_size[0] / out_w, target_size[1] / out_h)
+    if scale >= 1.0:
+        return None
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def _arena_buffer(
+    arena: BufferArena | None, name: str, shape: tuple[int, ...], dtype=np.uint8
+) -> np.ndarray | None:
+    """arena があればその作業バッファを、なければ None（OpenCVが新規確保する）を返す"""
+    if arena is None:
+        return None
+    return arena.get(name, shape, dtype)
+
+
 def rotate_image(
-    img: np.ndarray, angle_deg: float, keep_size: bool = False
+    img: np.ndarray,
+    angle_deg: float,
+    keep_size: bool = False,
+    dst: np.ndarray | None = None,
 ) -> np.ndarray:
     """中心回りに回転。
 
@@ -30,6 +286,7 @@ def rotate_image(
         img: 入力画像
         angle_deg: 回転角度（度）
         keep_size: Trueの場合は元のサイズを維持、Falseの場合は全体が収まるようにサイズ拡張
+        dst: 出力先（出力と同じ形状・dtype のとき、そこへ書き込む）
     """
     if not angle_deg:
         return img
@@ -41,7 +298,12 @@ def rotate_image(
     if keep_size:
         # 元のサイズを維持して回転（円形マスク用）
         rotated = cv.warpAffine(
-            img, mat, (w, h), flags=cv.INTER_LINEAR, borderMode=cv.BORDER_CONSTANT
+            img,
+            mat,
+            (w, h),
+            dst=dst,
+            flags=cv.INTER_LINEAR,
+            borderMode=cv.BORDER_CONSTANT,
         )
     else:
         # サイズを拡張して全体を表示
@@ -54,12 +316,21 @@ def rotate_image(
             img,
             mat,
             (new_w, new_h),
+            dst=dst,
             flags=cv.INTER_LINEAR,
             borderMode=cv.BORDER_CONSTANT,
         )
     return rotated
 
 
+def _get_clahe():
+    clahe = getattr(_clahe_local, "clahe", None)
+    if clahe is None:
+        clahe = cv.createCLAHE(clipLimit=4.0, tileGridSize=(8, 8))
+        _clahe_local.clahe = clahe
+    return clahe
+
+
 def colorize_mip(mip_img: np.ndarray, colormap: int) -> np.ndarray:
     # 1ch化
     if mip_img.ndim == 3:
@@ -71,8 +342,7 @@ def colorize_mip(mip_img: np.ndarray, colormap: int) -> np.ndarray:
         mip_u8 = mip_gray
     else:
         mip_u8 = cv.normalize(mip_gray, None, 0, 255, cv.NORM_MINMAX).astype(np.uint8)
-    clahe = cv.createCLAHE(clipLimit=4.0, tileGridSize=(8, 8))
-    mip_clahe = clahe.apply(mip_u8)
+    mip_clahe = _get_clahe().apply(mip_u8)
     # カラーマップ
     mip_color = cv.applyColorMap(mip_clahe, colormap)
     return mip_color
@@ -98,9 +368,95 @@ def blend_with_mask(
     return out.astype(np.uint8)
 
 
+@lru_cache(maxsize=64)
+def _blend_lut(alpha: float) -> np.ndarray:
+    """(front << 8 | back) を添字とする 256×256 のブレンド表。
+    blend_with_mask と同じ float32 演算・切り捨てで作るため、結果はビット単位で一致する。
+    UIのスライダーは0.05刻みなので、実際に作られる表は高々21種類。
+    """
+    front = np.arange(256, dtype=np.float32)[:, None]
+    back = np.arange(256, dtype=np.float32)[None, :]
+    lut = (alpha * front + (1.0 - alpha) * back).astype(np.uint8).ravel()
+    lut.flags.writeable = False
+    return lut
+
+
+def composite_masked_u8(
+    base: np.ndarray,
+    stages: list[tuple[np.ndarray, float, np.ndarray]],
+    out: np.ndarray | None = None,
+    regions: list[tuple[int, int, int, int]] | None = None,
+    stage_regions: list[list[tuple[int, int, int, int]] | None] | None = None,
+) -> np.ndarray:
+    """マスク付きアルファブレンドを順に適用する（uint8のまま、表引きで計算）。
+
+    blend_with_mask を連続で呼ぶのと同じ結果を、float32の全画面コピーを作らずに得る。
+
+    Args:
+        base: 背景画像 (uint8)
+        stages: (前景, alpha, マスク) の列。先頭から順に重ねる
+        out: 出力先（baseと同形状のuint8）。Noneなら新規確保
+        regions: 合成する矩形 (y0, y1, x0, x1) の列。Noneなら全画面。
+            範囲外の画素は base のまま（後段で塗りつぶされる領域などを省略できる）
+        stage_regions: 段ごとの合成範囲（マスクの非0画素を覆う矩形の列）。
+            指定した段では regions の代わりにこちらを使う
+    """
+    if out is None:
+        out = np.empty_like(base)
+    if out is not base:
+        np.copyto(out, base)
+    if regions is None:
+        regions = [(0, base.shape[0], 0, base.shape[1])]
+    for i, (front, alpha, mask) in enumerate(stages):
+        lut = _blend_lut(float(np.clip(alpha, 0.0, 1.0)))
+        rects = regions
+        if stage_regions is not None and stage_regions[i] is not None:
+            rects = stage_regions[i]
+        for y0, y1, x0, x1 in rects:
+            if y1 <= y0 or x1 <= x0:
+                continue
+            out_r = out[y0:y1, x0:x1]
+            idx = np.left_shift(front[y0:y1, x0:x1], 8, dtype=np.uint16)
+            np.bitwise_or(idx, out_r, out=idx)
+            blended = np.take(lut, idx)
+            where = mask[y0:y1, x0:x1] > 0
+            if out_r.ndim == 3 and where.ndim == 2:
+                where = where[:, :, None]
+            np.copyto(out_r, blended, where=where)
+    return out
+
+
+def mask_regions(
+    mask: np.ndarray, tile: int = 32
+) -> tuple[tuple[int, int, int, int], ...]:
+    """マスクの非0画素を覆う矩形 (y0, y1, x0, x1) の列を返す。
+    画面を tile 画素角のタイルに分け、非0画素を含むタイルを行ごとに連結した矩形にする。
+    細い血管マスクでも、合成範囲は血管の通るタイルだけになる。
+    """
+    h, w = mask.shape[:2]
+    ys = np.arange(0, h, tile)
+    xs = np.arange(0, w, tile)
+    occupied = np.maximum.reduceat(np.maximum.reduceat(mask, ys, axis=0), xs, axis=1)
+    occupied = occupied > 0
+    regions = []
+    for ty in np.flatnonzero(occupied.any(axis=1)):
+        row = np.concatenate(([False], occupied[ty], [False]))
+        edges = np.flatnonzero(row[1:] != row[:-1])
+        y0 = int(ys[ty])
+        y1 = min(y0 + tile, h)
+        for start, stop in zip(edges[::2], edges[1::2]):
+            regions.append((y0, y1, int(xs[start]), min(int(stop) * tile, w)))
+    return tuple(regions)
+
+
 # --- Helper functions ---
 def apply_transforms(
-    img: np.ndarray, flip_code: int | None, angle_deg: float, keep_size: bool = False
+    img: np.ndarray,
+    flip_code: int | None,
+    angle_deg: float,
+    keep_size: bool = False,
+    arena: BufferArena | None = None,
+    name: str = "img",
 ) -> np.ndarray:
     """Apply optional flip then rotation to an image.
 
@@ -109,31 +465,115 @@ def apply_transforms(
         flip_code: 反転コード (None, 0, 1, -1)
         angle_deg: 回転角度
         keep_size: Trueの場合は元のサイズを維持
+        arena: 作業バッファ（指定すると結果を arena の name バッファへ書き込む）
+        name: arena 内のバッファ名
     """
     if flip_code is not None and flip_code in (0, 1, -1):
-        img = cv.flip(img, flip_code)
-    img = rotate_image(img, angle_deg, keep_size=keep_size)
+        dst = _arena_buffer(arena, f"{name}.flip", img.shape, img.dtype)
+        img = cv.flip(img, flip_code, dst=dst)
+    dst = None
+    if arena is not None and angle_deg:
+        h, w = img.shape[:2]
+        out_w, out_h = (w, h) if keep_size else rotated_size(w, h, angle_deg)
+        dst = arena.get(name, (out_h, out_w) + img.shape[2:], img.dtype)
+    img = rotate_image(img, angle_deg, keep_size=keep_size, dst=dst)
     return img
 
 
+def _binary_mask(
+    img: np.ndarray,
+    arena: BufferArena | None = None,
+    name: str = "mask",
+) -> np.ndarray:
+    """グレースケール化して0より大きい画素を255にした2値マスク"""
+    shape = img.shape[:2]
+    gray = (
+        cv.cvtColor(
+            img, cv.COLOR_BGR2GRAY, dst=_arena_buffer(arena, name + ".gray", shape)
+        )
+        if img.ndim == 3
+        else img
+    )
+    _, mask = cv.threshold(
+        gray, 0, 255, cv.THRESH_BINARY, dst=_arena_buffer(arena, name, shape)
+    )
+    return mask
+
+
 def build_masks(
-    mid_img: np.ndarray, fg_img: np.ndarray
+    mid_img: np.ndarray, fg_img: np.ndarray, arena: BufferArena | None = None
 ) -> tuple[np.ndarray, np.ndarray]:
     """Build binary masks for MIP and vein from their grayscale representations."""
-    mid_gray = cv.cvtColor(mid_img, cv.COLOR_BGR2GRAY) if mid_img.ndim == 3 else mid_img
-    _, mask_mip = cv.threshold(mid_gray, 0, 255, cv.THRESH_BINARY)
-    fg_gray = cv.cvtColor(fg_img, cv.COLOR_BGR2GRAY)
-    _, mask_vein = cv.threshold(fg_gray, 0, 255, cv.THRESH_BINARY)
+    mask_mip = _binary_mask(mid_img, arena, "mask_mip")
+    mask_vein = _binary_mask(fg_img, arena, "mask_vein")
+    return mask_mip, mask_vein
+
+
+def load_masks(
+    mid_path: str,
+    fg_path: str,
+    mid_img: np.ndarray,
+    fg_img: np.ndarray,
+    cache_dir: str | None = None,
+    variant: tuple | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """正規向きのMIP・血管マスクを素材ごとのキャッシュ経由で返す（build_masks と同じ値）。
+    variant は mid_img の読み込み方（source_variant）で、MIPマスクのキーに含める。
+    キャッシュにないマスクだけを、その素材から2値化する。
+    """
+    mask_mip = _mask_cache.get_or_build(
+        mid_path,
+        mid_img.shape[:2],
+        lambda: _binary_mask(mid_img),
+        cache_dir,
+        variant=variant,
+    )
+    mask_vein = _mask_cache.get_or_build(
+        fg_path, fg_img.shape[:2], lambda: _binary_mask(fg_img), cache_dir
+    )
     return mask_mip, mask_vein
 
 
+def transform_mask(
+    mask: np.ndarray,
+    flip_code: int | None,
+    angle_deg: float,
+    keep_size: bool = False,
+    arena: BufferArena | None = None,
+    name: str = "mask",
+) -> np.ndarray:
+    """正規向きマスクに画像と同じ反転・回転を適用する（グレースケール化し直さない）。
+    補間で値が残った画素はマスク内とする。
+    """
+    mask = apply_transforms(
+        mask, flip_code, angle_deg, keep_size=keep_size, arena=arena, name=name
+    )
+    if arena is not None and not mask.flags.writeable:
+        # 変換なし（キャッシュの配列そのまま）の場合は上書きしない
+        arena = None
+    _, mask = cv.threshold(
+        mask, 0, 255, cv.THRESH_BINARY, dst=mask if arena is not None else None
+    )
+    return mask
+
+
+def get_mask_cache() -> PackedMaskCache:
+    return _mask_cache
+
+
 def make_base_bg(
-    bg_img: np.ndarray, processing: ProcessingConfig, mode_key: str | None
+    bg_img: np.ndarray,
+    processing: ProcessingConfig,
+    mode_key: str | None,
+    out: np.ndarray | None = None,
 ) -> np.ndarray:
+    """背景レイヤー: 既定はIR→肌色変換。bg_img はBGRでもグレースケール(IR値)でもよい。
+    out を渡すと肌色画像をそこへ書き込む。
+    """
     if mode_key == "task1":
         return bg_img
     hsv_tf = HSVTransformer(hue=processing.hue_for_bg, saturation=processing.sat_for_bg)
-    bg_skin = hsv_tf.convert_ir_to_skin_color(bg_img)
+    bg_skin = hsv_tf.convert_ir_to_skin_color(bg_img, out=out)
     return bg_skin
 
 
@@ -142,8 +582,13 @@ def make_mip_layer(
     processing: ProcessingConfig,
     mode_key: str | None,
     mip_colormap_override: int | None = None,
+    cache_key: tuple | None = None,
 ) -> np.ndarray:
-    """Front layer for MIP: default colorized; task1 uses image as-is (no processing)."""
+    """Front layer for MIP: default colorized; task1 uses image as-is (no processing).
+
+    cache_key（入力MIPを識別するキー）を渡すと、着色結果を (cache_key, colormap) で
+    キャッシュし、同じ素材・カラーマップではCLAHEを再計算しない。
+    """
     if mode_key == "task1" or mode_key == "task2" or mode_key == "task3":
         return mid_img
     colormap = (
@@ -151,7 +596,11 @@ def make_mip_layer(
         if mip_colormap_override is not None
         else processing.mip_colormap
     )
-    return colorize_mip(mid_img, colormap)
+    if cache_key is None:
+        return colorize_mip(mid_img, colormap)
+    return _layer_cache.get_or_create(
+        ("mip", cache_key, colormap), lambda: colorize_mip(mid_img, colormap)
+    )
 
 
 def make_vein_layer(
@@ -159,10 +608,23 @@ def make_vein_layer(
     processing: ProcessingConfig,
     mode_key: str | None,
     fg_img: np.ndarray | None = None,
+    ir_frame: np.ndarray | None = None,
+    out: np.ndarray | None = None,
 ) -> np.ndarray:
-    """Front layer for veins: default HSV tint; task1 uses vein image as-is (no processing)."""
+    """Front layer for veins: default HSV tint; task1 uses vein image as-is (no processing).
+
+    ir_frame（背景のIR値）を渡すと、肌色変換と同じV値から対応表で直接ティントを作る
+    （bg_base を BGR→HSV→BGR するのと同一の結果）。その場合 out へ書き込める。
+    """
     if (mode_key == "task1" or mode_key == "task2") and fg_img is not None:
         return fg_img
+    if ir_frame is not None and mode_key != "task1":
+        hsv_tf = HSVTransformer(
+            hue=processing.hue_for_bg, saturation=processing.sat_for_bg
+        )
+        return hsv_tf.convert_ir_to_tint_color(
+            ir_frame, processing.vein_h, processing.vein_s, out=out
+        )
     bg_hsv = cv.cvtColor(bg_base, cv.COLOR_BGR2HSV)
     vein_hsv = np.zeros_like(bg_hsv)
     vein_hsv[:, :, 0] = np.uint8(np.clip(processing.vein_h, 0, 179))
@@ -171,87 +633,1014 @@ def make_vein_layer(
     return cv.cvtColor(vein_hsv, cv.COLOR_HSV2BGR)
 
 
+def _circle_params(h: int, w: int) -> tuple[tuple[int, int], int]:
+    # 画像サイズが固定されるので、円の半径も固定される
+    return (w // 2, h // 2), min(w, h) // 2
+
+
+@lru_cache(maxsize=16)
+def circle_mask(h: int, w: int, radius: int) -> np.ndarray:
+    """画像中心・半径 radius の円の内側を255とするマスク（書き込み不可・キャッシュ）"""
+    mask = np.zeros((h, w), dtype=np.uint8)
+    cv.circle(mask, (w // 2, h // 2), radius, 255, -1)
+    mask.flags.writeable = False
+    return mask
+
+
+@lru_cache(maxsize=4)
+def _filled_background(
+    h: int, w: int, channels: int, color: tuple, dtype_str: str
+) -> np.ndarray:
+    """背景色で塗りつぶした画像（書き込み不可・キャッシュ）"""
+    shape = (h, w) if channels == 0 else (h, w, channels)
+    img = np.empty(shape, dtype=np.dtype(dtype_str))
+    img[...] = color[:channels] if channels else color[0]
+    img.flags.writeable = False
+    return img
+
+
+@lru_cache(maxsize=16)
+def circle_regions(
+    h: int, w: int, radius: int, bands: int = 32
+) -> tuple[tuple[int, int, int, int], ...]:
+    """円の内側を覆う矩形 (y0, y1, x0, x1) の列（キャッシュ）。
+    円の外接矩形を横帯に分け、帯ごとに円がかかる列範囲だけを残すため、
+    四隅（外接正方形の約21%）の画素はどの矩形にも含まれない。
+    """
+    mask = circle_mask(h, w, radius)
+    rows = np.flatnonzero(mask.any(axis=1))
+    if rows.size == 0:
+        return ()
+    y_top, y_bottom = int(rows[0]), int(rows[-1]) + 1
+    step = max(1, -(-(y_bottom - y_top) // bands))
+    regions = []
+    for y0 in range(y_top, y_bottom, step):
+        y1 = min(y0 + step, y_bottom)
+        cols = np.flatnonzero(mask[y0:y1].any(axis=0))
+        if cols.size:
+            regions.append((y0, y1, int(cols[0]), int(cols[-1]) + 1))
+    return tuple(regions)
+
+
+def circular_regions_for(img: np.ndarray) -> tuple[tuple[int, int, int, int], ...]:
+    """apply_circular_mask で残る（円の内側の）画素を覆う矩形の列"""
+    h, w = img.shape[:2]
+    _, radius = _circle_params(h, w)
+    return circle_regions(h, w, radius)
+
+
+def circle_mask_for(img: np.ndarray) -> np.ndarray:
+    """apply_circular_mask で残る（円の内側の）画素のマスク"""
+    h, w = img.shape[:2]
+    _, radius = _circle_params(h, w)
+    return circle_mask(h, w, radius)
+
+
 def apply_circular_mask(
-    img: np.ndarray, background_color: tuple = (0, 0, 0)
+    img: np.ndarray,
+    background_color: tuple = (0, 0, 0),
+    out: np.ndarray | None = None,
 ) -> np.ndarray:
     """
     画像に円形マスクを適用し、円の外側を背景色で塗りつぶす
+    （円マスクと背景色の画像はサイズごとにキャッシュし、合成は1回のマスク付きコピーで行う）
 
     Args:
         img: 入力画像 (BGR)
         background_color: 円の外側の色 (B, G, R)
+        out: 出力先（img と同形状。img 自身は不可）。Noneなら新規確保
 
     Returns:
         円形マスクを適用した画像
     """
     h, w = img.shape[:2]
-    center = (w // 2, h // 2)
-    # 画像サイズが固定されるので、円の半径も固定される
-    radius = min(w, h) // 2
-
-    # 円形マスクを作成
-    mask = np.zeros((h, w), dtype=np.uint8)
-    cv.circle(mask, center, radius, 255, -1)
+    _, radius = _circle_params(h, w)
+    mask = circle_mask(h, w, radius)
 
-    # マスク適用
-    result = img.copy()
-    if len(img.shape) == 3:
-        for i in range(3):
-            result[:, :, i][mask == 0] = background_color[i]
+    # マスク適用（背景色の画像に、円の内側だけ入力画像を1回で書き込む）
+    channels = img.shape[2] if img.ndim == 3 else 0
+    background = _filled_background(
+        h, w, channels, tuple(background_color), img.dtype.str
+    )
+    if out is None:
+        result = background.copy()
     else:
-        result[mask == 0] = background_color[0]
+        result = out
+        np.copyto(result, background)
+    cv.copyTo(img, mask, result)
 
     return result
 
 
-def blend_three(
+def ir_frame(
+    bg: np.ndarray,
+    mode_key: str | None,
+    arena: BufferArena | None = None,
+    name: str = "bg.gray",
+) -> np.ndarray | None:
+    """背景のIR値（グレースケール）。task1 は肌色変換しないので None。"""
+    if mode_key == "task1":
+        return None
+    if bg.ndim != 3:
+        return bg
+    return cv.cvtColor(
+        bg, cv.COLOR_BGR2GRAY, dst=_arena_buffer(arena, name, bg.shape[:2])
+    )
+
+
+@dataclass
+class BlendLayers:
+    """重畳前のレイヤー一式（背景・MIP・血管と、それぞれのマスク）"""
+
+    base_bg: np.ndarray
+    mip_layer: np.ndarray
+    vein_layer: np.ndarray
+    mask_mip: np.ndarray
+    mask_vein: np.ndarray
+    # mask_regions の結果（段ごと）。sparse_compositing 用に初回に計算して保持する
+    stage_regions: list | None = None
+
+
+def build_layers(
+    bg: np.ndarray,
+    mid: np.ndarray,
+    fg: np.ndarray,
+    processing: ProcessingConfig,
+    mode_key: str | None = None,
+    mip_colormap_override: int | None = None,
+    mip_layer: np.ndarray | None = None,
+    masks: tuple[np.ndarray, np.ndarray] | None = None,
+    arena: BufferArena | None = None,
+) -> BlendLayers:
+    """同サイズの3画像からマスクとレイヤーを生成する（幾何変換は行わない）。
+    mip_layer / masks を渡した場合はその生成を省略して渡されたものを使う。
+    arena を渡すと、生成するレイヤーとマスクを arena のバッファへ書き込む。
+    """
+    if masks is None:
+        masks = build_masks(mid, fg, arena=arena)
+    mask_mip, mask_vein = masks
+    # 背景と血管ティントは同じIR値(V)から対応表で作る（グレースケール化は1回だけ）
+    ir = ir_frame(bg, mode_key, arena)
+    shape = bg.shape[:2]
+    base_bg = make_base_bg(
+        bg if ir is None else ir,
+        processing,
+        mode_key,
+        out=_arena_buffer(arena, "base_bg", shape + (3,)),
+    )
+    if mip_layer is None:
+        mip_layer = make_mip_layer(
+            mid, processing, mode_key, mip_colormap_override=mip_colormap_override
+        )
+    vein_layer = make_vein_layer(
+        base_bg,
+        processing,
+        mode_key,
+        fg_img=fg,
+        ir_frame=ir,
+        out=_arena_buffer(arena, "vein", shape + (3,)),
+    )
+    return BlendLayers(base_bg, mip_layer, vein_layer, mask_mip, mask_vein)
+
+
+def composite_layers(
+    layers: BlendLayers,
+    params: BlendParams,
+    regions: list[tuple[int, int, int, int]] | None = None,
+    sparse: bool = False,
+    clip_mask: np.ndarray | None = None,
+    out: np.ndarray | None = None,
+) -> np.ndarray:
+    """背景 → MIP → 血管の順でマスク付きブレンドする（順序固定）。
+    regions を渡すとその矩形内だけを合成する（composite_masked_u8 を参照）。
+    sparse=True ならマスクの非0画素を覆う矩形（レイヤーごとにキャッシュ）の中だけを合成する。
+    clip_mask は sparse 時の範囲を最終出力に残る画素へ絞るためのマスク。
+    out を渡すと合成結果をそこへ書き込む。
+    """
+    stage_regions = layer_stage_regions(layers, clip_mask) if sparse else None
+    return composite_masked_u8(
+        layers.base_bg,
+        [
+            (layers.mip_layer, params.alpha_mid, layers.mask_mip),
+            (layers.vein_layer, params.alpha_fg, layers.mask_vein),
+        ],
+        out=out,
+        regions=regions,
+        stage_regions=stage_regions,
+    )
+
+
+def layer_stage_regions(
+    layers: BlendLayers, clip_mask: np.ndarray | None = None
+) -> list:
+    """MIP・血管マスクそれぞれの合成範囲（初回に計算してレイヤーに保持する）"""
+    if layers.stage_regions is None:
+        layers.stage_regions = [
+            _clipped_mask_regions(mask, clip_mask)
+            for mask in (layers.mask_mip, layers.mask_vein)
+        ]
+    return layers.stage_regions
+
+
+def _clipped_mask_regions(mask: np.ndarray, clip_mask: np.ndarray | None) -> list:
+    if clip_mask is not None:
+        mask = cv.bitwise_and(mask, clip_mask)
+    return mask_regions(mask)
+
+
+def _clips_output(processing: ProcessingConfig) -> bool:
+    # 円形表示かつ合成後に回転しない場合、円の外側は後で塗りつぶされる
+    return processing.circular_display and not processing.transform_last
+
+
+def output_regions(
+    layers: BlendLayers, processing: ProcessingConfig
+) -> tuple[tuple[int, int, int, int], ...] | None:
+    """最終出力に残る画素だけを覆う合成範囲（全画面なら None）。
+    円形表示かつ合成後に回転しない場合、円の外側は後で塗りつぶされるため合成を省く。
+    """
+    if _clips_output(processing):
+        return circular_regions_for(layers.base_bg)
+    return None
+
+
+def _composite_key(
+    paths: tuple[str, str, str],
+    params: BlendParams,
+    processing: ProcessingConfig,
+    mode_key: str | None,
+    mip_colormap_override: int | None,
+    size: tuple[int, int] | None = None,
+) -> tuple:
+    """正規向きの合成結果を識別するキー（入力ファイルと見た目に効く設定）"""
+    return (
+        tuple(file_key(p) for p in paths),
+        size,
+        float(params.alpha_mid),
+        float(params.alpha_fg),
+        processing.hue_for_bg,
+        processing.sat_for_bg,
+        processing.vein_h,
+        processing.vein_s,
+        processing.mip_colormap,
+        mode_key,
+        mip_colormap_override,
+        source_variant(processing, "ir"),
+        source_variant(processing, "mip"),
+    )
+
+
+@dataclass
+class LayerSources:
+    """build_layers の入力（変換済みの3画像・MIPレイヤー・任意のマスク）"""
+
+    bg: np.ndarray
+    mid: np.ndarray
+    fg: np.ndarray
+    mip_layer: np.ndarray
+    masks: tuple[np.ndarray, np.ndarray] | None = None
+
+
+def prepare_sources(
     bg_path: str,
     mid_path: str,
     fg_path: str,
-    params: BlendParams,
     rotation_deg: float = 0.0,
     flip_code: int | None = None,
     processing: ProcessingConfig | None = None,
     mode_key: str | None = None,
     mip_colormap_override: int | None = None,
-) -> np.ndarray:
-    # 読み込み
-    bg = read_color(bg_path)
-    mid = read_color(mid_path)
-    fg = read_color(fg_path)
+    target_size: tuple[int, int] | None = None,
+    arena: BufferArena | None = None,
+    size: tuple[int, int] | None = None,
+) -> LayerSources:
+    """読み込み・MIPの着色・幾何変換までを行い、build_layers の入力を返す
+    （引数は prepare_layers と同じ）。size (幅, 高さ) を指定すると、target_size から
+    決める代わりにその作業解像度で読み込む。transform_last モードでは変換しない。
+    """
+    if processing is None:
+        processing = ProcessingConfig()
 
-    # 設定
+    # 読み込み（デコード済みキャッシュ経由）とサイズ合わせ（まだ変換前）
+    if size is None:
+        size = group_working_size(bg_path, processing, rotation_deg, target_size)
+    bg, mid, fg = load_group(
+        bg_path, mid_path, fg_path, size=size, processing=processing
+    )
+
+    # MIPの着色（CLAHE＋カラーマップ）は正規向きで行い、素材ごとにキャッシュする
+    mip_layer = make_mip_layer(
+        mid,
+        processing,
+        mode_key,
+        mip_colormap_override=mip_colormap_override,
+        cache_key=(file_key(mid_path), size, source_variant(processing, "mip")),
+    )
+    masks = None
+    if processing.packed_mask_cache:
+        masks = load_masks(
+            mid_path,
+            fg_path,
+            mid,
+            fg,
+            processing.mask_cache_dir,
+            variant=source_variant(processing, "mip"),
+        )
+
+    if not processing.transform_last:
+        # 円形表示の場合は元サイズを保持
+        keep_size = processing.circular_display
+        colorized = mip_layer is not mid
+        # 3画像へ変換適用（flip→rotate）
+        bg = apply_transforms(
+            bg, flip_code, rotation_deg, keep_size=keep_size, arena=arena, name="bg"
+        )
+        mid = apply_transforms(
+            mid, flip_code, rotation_deg, keep_size=keep_size, arena=arena, name="mid"
+        )
+        fg = apply_transforms(
+            fg, flip_code, rotation_deg, keep_size=keep_size, arena=arena, name="fg"
+        )
+        if colorized:
+            mip_layer = apply_transforms(
+                mip_layer,
+                flip_code,
+                rotation_deg,
+                keep_size=keep_size,
+                arena=arena,
+                name="mip",
+            )
+        else:
+            mip_layer = mid
+        if masks is not None:
+            masks = tuple(
+                transform_mask(
+                    m,
+                    flip_code,
+                    rotation_deg,
+                    keep_size=keep_size,
+                    arena=arena,
+                    name=name,
+                )
+                for m, name in zip(masks, ("mask_mip", "mask_vein"))
+            )
+
+    return LayerSources(bg, mid, fg, mip_layer, masks)
+
+
+def prepare_layers(
+    bg_path: str,
+    mid_path: str,
+    fg_path: str,
+    rotation_deg: float = 0.0,
+    flip_code: int | None = None,
+    processing: ProcessingConfig | None = None,
+    mode_key: str | None = None,
+    mip_colormap_override: int | None = None,
+    target_size: tuple[int, int] | None = None,
+    arena: BufferArena | None = None,
+) -> BlendLayers:
+    """合成直前のレイヤーを返す。
+    transform_last モードでは正規向き、それ以外では反転・回転を適用済みのレイヤー。
+    target_size (幅, 高さ) を指定すると、出力がそのサイズに収まる解像度まで
+    入力を先に縮小してから処理する。
+    arena を渡すとレイヤーは arena のバッファに作られる（次の呼び出しで上書きされる）。
+    """
     if processing is None:
         processing = ProcessingConfig()
+    src = prepare_sources(
+        bg_path,
+        mid_path,
+        fg_path,
+        rotation_deg=rotation_deg,
+        flip_code=flip_code,
+        processing=processing,
+        mode_key=mode_key,
+        mip_colormap_override=mip_colormap_override,
+        target_size=target_size,
+        arena=arena,
+    )
+    return build_layers(
+        src.bg,
+        src.mid,
+        src.fg,
+        processing,
+        mode_key,
+        mip_colormap_override,
+        mip_layer=src.mip_layer,
+        masks=src.masks,
+        arena=arena,
+    )
 
-    # サイズ合わせ（まだ変換前）
-    mid = ensure_size(bg, mid)
-    fg = ensure_size(bg, fg)
 
-    # 円形表示の場合は元サイズを保持
-    keep_size = processing.circular_display
+# 入力ごとに効く設定の項目（レイヤーグラフで、その項目が変わったノードだけを作り直す）
+_LOAD_FIELDS = ("high_bit_depth", "ir_window", "mip_window", "asset_pack_dir")
+_SKIN_FIELDS = ("hue_for_bg", "sat_for_bg")
+_TINT_FIELDS = ("hue_for_bg", "sat_for_bg", "vein_h", "vein_s")
+_MASK_FIELDS = ("packed_mask_cache", "mask_cache_dir")
+_OUTPUT_FIELDS = ("circular_display", "transform_last", "sparse_compositing")
 
-    # 3画像へ変換適用（flip→rotate）
-    bg_pre = apply_transforms(bg, flip_code, rotation_deg, keep_size=keep_size)
-    mid = apply_transforms(mid, flip_code, rotation_deg, keep_size=keep_size)
-    fg = apply_transforms(fg, flip_code, rotation_deg, keep_size=keep_size)
 
-    # マスク生成
-    mask_mip, mask_vein = build_masks(mid, fg)
+def _config_slice(*fields: str) -> Callable[[ProcessingConfig], ProcessingConfig]:
+    """processing の fields だけを写した設定（他の項目は既定値）を返す関数"""
 
-    # レイヤー生成
-    base_bg = make_base_bg(bg_pre, processing, mode_key)
-    mip_layer = make_mip_layer(
-        mid, processing, mode_key, mip_colormap_override=mip_colormap_override
+    def _slice(processing: ProcessingConfig) -> ProcessingConfig:
+        return ProcessingConfig(**{f: getattr(processing, f) for f in fields})
+
+    return _slice
+
+
+def build_blend_graph(arena: BufferArena | None = None) -> LayerGraph:
+    """blend_three の合成（背景 → MIP → 血管）を表すレイヤーグラフを作る。
+
+    パラメータ: bg_path, mid_path, fg_path, size（作業解像度、None なら元解像度）,
+    rotation_deg, flip_code, processing, mode_key, mip_colormap_override, alpha_mid, alpha_fg。
+    各レイヤーは入力（素材・設定の一部）、変換（反転・回転。transform_last なら無変換）、
+    合成の指定（マスク・alpha・合成範囲）を宣言し、変わった入力に依存するものだけを作り直す。
+    仕上げ（transform_last の回転・円形マスク）は含まないので、結果に finish_output を適用する。
+    arena を渡すとレイヤーを arena の "layer." で始まる名前のバッファへ書き込む
+    （グラフが保持するので、同じ arena を別のグラフと共有しないこと）。
+    新しい重ね合わせは nodes / overlays に追加して拡張する。
+    """
+
+    def _transformed(name: str):
+        def _compute(src, transform):
+            if transform is None:
+                return src
+            flip_code, rotation_deg, keep_size = transform
+            return apply_transforms(
+                src,
+                flip_code,
+                rotation_deg,
+                keep_size=keep_size,
+                arena=arena,
+                name=f"layer.{name}",
+            )
+
+        return _compute
+
+    def _transform_params(processing, flip_code, rotation_deg):
+        if processing.transform_last:
+            return None
+        # 円形表示の場合は元サイズを保持
+        return flip_code, rotation_deg, processing.circular_display
+
+    def _mip_color(mid_src, mid_path, size, load_cfg, mip_cfg, mode_key):
+        # 着色（CLAHE＋カラーマップ）は正規向きで行い、素材ごとにキャッシュする
+        return make_mip_layer(
+            mid_src,
+            mip_cfg,
+            mode_key,
+            cache_key=(file_key(mid_path), size, source_variant(load_cfg, "mip")),
+        )
+
+    def _mip(mip_color, mid_src, mid, transform):
+        # 着色しないモードでは変換済みの mid をそのまま使う
+        if mip_color is mid_src:
+            return mid
+        return _transformed("mip")(mip_color, transform)
+
+    def _canonical_masks(mid_path, fg_path, mid_src, fg_src, mask_cfg, load_cfg):
+        if not mask_cfg.packed_mask_cache:
+            return None
+        return load_masks(
+            mid_path,
+            fg_path,
+            mid_src,
+            fg_src,
+            mask_cfg.mask_cache_dir,
+            variant=source_variant(load_cfg, "mip"),
+        )
+
+    def _mask(index: int, name: str):
+        def _compute(canonical, img, transform):
+            if canonical is None:
+                return _binary_mask(img, arena, f"layer.{name}")
+            if transform is None:
+                return canonical[index]
+            flip_code, rotation_deg, keep_size = transform
+            return transform_mask(
+                canonical[index],
+                flip_code,
+                rotation_deg,
+                keep_size=keep_size,
+                arena=arena,
+                name=f"layer.{name}",
+            )
+
+        return _compute
+
+    def _clip(shape, output_cfg):
+        if not _clips_output(output_cfg):
+            return None
+        h, w = shape
+        return circle_mask(h, w, _circle_params(h, w)[1])
+
+    def _out_regions(shape, output_cfg):
+        if not _clips_output(output_cfg):
+            return None
+        h, w = shape
+        return circle_regions(h, w, _circle_params(h, w)[1])
+
+    def _stage_regions(mask, clip, output_cfg):
+        if not output_cfg.sparse_compositing:
+            return None
+        return _clipped_mask_regions(mask, clip)
+
+    transform = ("transform",)
+    nodes = [
+        # 設定から各レイヤーに効く項目だけを取り出す（変わらなければ下流は作り直さない）
+        GraphNode("load_cfg", _config_slice(*_LOAD_FIELDS), ("processing",), cutoff=True),
+        GraphNode("skin_cfg", _config_slice(*_SKIN_FIELDS), ("processing",), cutoff=True),
+        GraphNode("tint_cfg", _config_slice(*_TINT_FIELDS), ("processing",), cutoff=True),
+        GraphNode("mask_cfg", _config_slice(*_MASK_FIELDS), ("processing",), cutoff=True),
+        GraphNode("output_cfg", _config_slice(*_OUTPUT_FIELDS), ("processing",), cutoff=True),
+        GraphNode(
+            "mip_cfg",
+            lambda processing, override: ProcessingConfig(
+                mip_colormap=processing.mip_colormap if override is None else override
+            ),
+            ("processing", "mip_colormap_override"),
+            cutoff=True,
+        ),
+        GraphNode(
+            "transform",
+            _transform_params,
+            ("processing", "flip_code", "rotation_deg"),
+            cutoff=True,
+        ),
+        # 素材（デコード済みキャッシュ経由。変わらない素材は同じ配列なので下流を作り直さない）
+        GraphNode(
+            "sources",
+            lambda bg, mid, fg, size, load_cfg: load_group(
+                bg, mid, fg, size=size, processing=load_cfg
+            ),
+            ("bg_path", "mid_path", "fg_path", "size", "load_cfg"),
+        ),
+        GraphNode("bg_src", lambda s: s[0], ("sources",), cutoff=True),
+        GraphNode("mid_src", lambda s: s[1], ("sources",), cutoff=True),
+        GraphNode("fg_src", lambda s: s[2], ("sources",), cutoff=True),
+        # 変換（反転＋回転）
+        GraphNode("bg", _transformed("bg"), ("bg_src",) + transform),
+        GraphNode("mid", _transformed("mid"), ("mid_src",) + transform),
+        GraphNode("fg", _transformed("fg"), ("fg_src",) + transform),
+        # 背景レイヤー
+        GraphNode(
+            "ir",
+            lambda bg, mode_key: ir_frame(bg, mode_key, arena, "layer.bg.gray"),
+            ("bg", "mode_key"),
+        ),
+        GraphNode(
+            "base",
+            lambda bg, ir, skin_cfg, mode_key: make_base_bg(
+                bg if ir is None else ir,
+                skin_cfg,
+                mode_key,
+                out=_arena_buffer(arena, "layer.base_bg", bg.shape[:2] + (3,)),
+            ),
+            ("bg", "ir", "skin_cfg", "mode_key"),
+        ),
+        GraphNode("shape", lambda base: base.shape[:2], ("base",), cutoff=True),
+        # MIPレイヤー
+        GraphNode(
+            "mip_color",
+            _mip_color,
+            ("mid_src", "mid_path", "size", "load_cfg", "mip_cfg", "mode_key"),
+            cutoff=True,
+        ),
+        GraphNode("mip", _mip, ("mip_color", "mid_src", "mid") + transform),
+        # 血管レイヤー
+        GraphNode(
+            "vein",
+            lambda base, fg, ir, tint_cfg, mode_key: make_vein_layer(
+                base,
+                tint_cfg,
+                mode_key,
+                fg_img=fg,
+                ir_frame=ir,
+                out=_arena_buffer(arena, "layer.vein", base.shape[:2] + (3,)),
+            ),
+            ("base", "fg", "ir", "tint_cfg", "mode_key"),
+        ),
+        # マスクと合成範囲
+        GraphNode(
+            "masks",
+            _canonical_masks,
+            ("mid_path", "fg_path", "mid_src", "fg_src", "mask_cfg", "load_cfg"),
+            cutoff=True,
+        ),
+        GraphNode("mask_mip", _mask(0, "mask_mip"), ("masks", "mid") + transform),
+        GraphNode("mask_vein", _mask(1, "mask_vein"), ("masks", "fg") + transform),
+        GraphNode("clip", _clip, ("shape", "output_cfg"), cutoff=True),
+        GraphNode("out_regions", _out_regions, ("shape", "output_cfg"), cutoff=True),
+        GraphNode(
+            "mip_regions", _stage_regions, ("mask_mip", "clip", "output_cfg")
+        ),
+        GraphNode(
+            "vein_regions", _stage_regions, ("mask_vein", "clip", "output_cfg")
+        ),
+    ]
+    overlays = [
+        OverlaySpec("mip_stage", "mip", "mask_mip", "alpha_mid", "mip_regions"),
+        OverlaySpec("vein_stage", "vein", "mask_vein", "alpha_fg", "vein_regions"),
+    ]
+    return LayerGraph(
+        nodes=nodes,
+        base="base",
+        overlays=overlays,
+        blend=composite_masked_u8,
+        regions="out_regions",
     )
-    vein_layer = make_vein_layer(base_bg, processing, mode_key, fg_img=fg)
 
-    # ブレンド（順序固定）
-    blend1 = blend_with_mask(base_bg, mip_layer, params.alpha_mid, mask_mip)
-    out = blend_with_mask(blend1, vein_layer, params.alpha_fg, mask_vein)
 
-    # 円形マスク適用（設定が有効な場合）
+def _thread_graph(arena: BufferArena | None) -> LayerGraph:
+    """このスレッドのレイヤーグラフ（arena が前回と違えばその arena で作り直す）"""
+    graph = getattr(_graph_local, "graph", None)
+    if graph is None or (arena is not None and _graph_local.arena is not arena):
+        graph = build_blend_graph(arena)
+        _graph_local.graph = graph
+        _graph_local.arena = arena
+    return graph
+
+
+def render_layered(
+    bg_path: str,
+    mid_path: str,
+    fg_path: str,
+    params: BlendParams,
+    rotation_deg: float = 0.0,
+    flip_code: int | None = None,
+    processing: ProcessingConfig | None = None,
+    mode_key: str | None = None,
+    mip_colormap_override: int | None = None,
+    target_size: tuple[int, int] | None = None,
+    arena: BufferArena | None = None,
+    graph: LayerGraph | None = None,
+) -> np.ndarray:
+    """スレッドごとのレイヤーグラフで合成し、仕上げ（finish_output）まで行った画像を返す
+    （引数は blend_three と同じ）。前回の呼び出しから変わった入力に依存するレイヤーと
+    段だけを作り直す（alpha だけなら合成のみ、カラーマップならMIPのみ、素材が変われば
+    その素材のレイヤーのみ）。結果は blend_three と一致する。
+    arena を渡した場合の戻り値は、次にこのスレッドで呼ぶまでに複製して使うこと。
+    graph（build_blend_graph）を渡すと、スレッドごとのグラフの代わりにそれを使う。
+    """
+    if processing is None:
+        processing = ProcessingConfig()
+    if graph is None:
+        graph = _thread_graph(arena)
+    graph.set(
+        bg_path=bg_path,
+        mid_path=mid_path,
+        fg_path=fg_path,
+        size=group_working_size(bg_path, processing, rotation_deg, target_size),
+        rotation_deg=rotation_deg,
+        flip_code=flip_code,
+        processing=processing,
+        mode_key=mode_key,
+        mip_colormap_override=mip_colormap_override,
+        alpha_mid=float(params.alpha_mid),
+        alpha_fg=float(params.alpha_fg),
+    )
+    rendered = graph.render()
+    out = finish_output(
+        rendered, processing, rotation_deg=rotation_deg, flip_code=flip_code, arena=arena
+    )
+    if out is rendered and arena is None:
+        # グラフ内のバッファは次の呼び出しで上書きされるため複製して返す
+        out = out.copy()
+    return out
+
+
+def row_bands(height: int, count: int, min_rows: int = 64) -> list[tuple[int, int]]:
+    """0..height の行を count 本程度の横帯 (y0, y1) に分ける（1本あたり min_rows 行以上）"""
+    count = max(1, min(int(count), height // max(1, min_rows)))
+    step = -(-height // count)
+    return [(y0, min(y0 + step, height)) for y0 in range(0, height, step)]
+
+
+def _band_regions(
+    regions: list[tuple[int, int, int, int]] | None, y0: int, y1: int
+) -> list[tuple[int, int, int, int]] | None:
+    """全画面座標の矩形列を横帯 y0..y1 に切り詰め、帯内の座標にする"""
+    if regions is None:
+        return None
+    return [
+        (max(ry0, y0) - y0, min(ry1, y1) - y0, rx0, rx1)
+        for ry0, ry1, rx0, rx1 in regions
+        if ry0 < y1 and ry1 > y0
+    ]
+
+
+def _get_tile_pool() -> ThreadPoolExecutor:
+    """横帯並列用のプール（_TILE_POOL_SIZE スレッド。tile_workers が変わっても共有する）"""
+    global _tile_pool
+    with _tile_pool_lock:
+        if _tile_pool is None:
+            _tile_pool = ThreadPoolExecutor(
+                max_workers=_TILE_POOL_SIZE, thread_name_prefix="blend-tile"
+            )
+        return _tile_pool
+
+
+def composite_tiled(
+    src: LayerSources,
+    params: BlendParams,
+    processing: ProcessingConfig,
+    mode_key: str | None = None,
+    mip_colormap_override: int | None = None,
+    workers: int = 2,
+    arena: BufferArena | None = None,
+) -> np.ndarray:
+    """レイヤー生成（肌色・ティント・マスク）から合成・円形マスクまでを横帯に分けて並列に行う。
+
+    どの段も行ごとに独立した画素処理なので、結果は build_layers → composite_layers →
+    finish_output（transform_last でない場合）と一致する。幾何変換は帯に分けると
+    固定小数点の丸めが変わるため、src の時点で全画面に適用済みのものを使う。
+    workers は共有プールのスレッド数（CPUコア数）までに抑える。
+    """
+    h, w = src.bg.shape[:2]
+    clip = None
+    regions = None
+    if processing.circular_display:
+        _, radius = _circle_params(h, w)
+        clip = circle_mask(h, w, radius)
+        regions = list(circle_regions(h, w, radius))
+    composite = _arena_buffer(arena, "composite", (h, w, 3))
+    if composite is None:
+        composite = np.empty((h, w, 3), dtype=np.uint8)
+    final = composite
+    background = None
     if processing.circular_display:
-        out = apply_circular_mask(out, background_color=processing.circular_bg_color)
+        final = _arena_buffer(arena, "output", (h, w, 3))
+        if final is None:
+            final = np.empty((h, w, 3), dtype=np.uint8)
+        background = _filled_background(
+            h, w, 3, tuple(processing.circular_bg_color), final.dtype.str
+        )
+
+    def _render_band(band: tuple[int, int]) -> None:
+        y0, y1 = band
+        rows = slice(y0, y1)
+        masks = src.masks
+        if masks is not None:
+            masks = (masks[0][rows], masks[1][rows])
+        layers = build_layers(
+            src.bg[rows],
+            src.mid[rows],
+            src.fg[rows],
+            processing,
+            mode_key,
+            mip_colormap_override,
+            mip_layer=src.mip_layer[rows],
+            masks=masks,
+        )
+        composite_layers(
+            layers,
+            params,
+            _band_regions(regions, y0, y1),
+            sparse=processing.sparse_compositing,
+            clip_mask=None if clip is None else clip[rows],
+            out=composite[rows],
+        )
+        if background is not None:
+            np.copyto(final[rows], background[rows])
+            cv.copyTo(composite[rows], clip[rows], final[rows])
 
+    workers = max(1, min(int(workers), _TILE_POOL_SIZE))
+    bands = row_bands(h, workers * 4)
+    if workers == 1:
+        for band in bands:
+            _render_band(band)
+        return final
+
+    def _render_bands(group: list[tuple[int, int]]) -> None:
+        for band in group:
+            _render_band(band)
+
+    # 帯を workers 組に分け、組ごとに順に処理する（同時に動くのは workers スレッドまで）
+    groups = [bands[i::workers] for i in range(workers)]
+    list(_get_tile_pool().map(_render_bands, groups))
+    return final
+
+
+def finish_output(
+    out: np.ndarray,
+    processing: ProcessingConfig,
+    rotation_deg: float = 0.0,
+    flip_code: int | None = None,
+    arena: BufferArena | None = None,
+) -> np.ndarray:
+    """合成結果の仕上げ（transform_last なら反転＋回転、続けて円形マスク）"""
+    if processing.transform_last:
+        out = apply_transforms(
+            out,
+            flip_code,
+            rotation_deg,
+            keep_size=processing.circular_display,
+            arena=arena,
+            name="transformed",
+        )
+    # 円形マスク適用（設定が有効な場合）
+    if processing.circular_display:
+        out = apply_circular_mask(
+            out,
+            background_color=processing.circular_bg_color,
+            out=_arena_buffer(arena, "output", out.shape, out.dtype),
+        )
     return out
+
+
+def output_clip_mask(
+    layers: BlendLayers, processing: ProcessingConfig
+) -> np.ndarray | None:
+    """最終出力に残る画素のマスク（Recompositor 用。全画面なら None）"""
+    if _clips_output(processing):
+        return circle_mask_for(layers.base_bg)
+    return None
+
+
+def resize_layers(layers: BlendLayers, width: int, height: int) -> BlendLayers:
+    """レイヤーを指定サイズへ縮小する（画像はINTER_AREA、マスクは最近傍）。"""
+    size = (int(width), int(height))
+    return BlendLayers(
+        cv.resize(layers.base_bg, size, interpolation=cv.INTER_AREA),
+        cv.resize(layers.mip_layer, size, interpolation=cv.INTER_AREA),
+        cv.resize(layers.vein_layer, size, interpolation=cv.INTER_AREA),
+        cv.resize(layers.mask_mip, size, interpolation=cv.INTER_NEAREST),
+        cv.resize(layers.mask_vein, size, interpolation=cv.INTER_NEAREST),
+    )
+
+
+class Recompositor:
+    """レイヤーとマスクを固定し、alphaだけを変えて再合成するための前計算済みオブジェクト。
+
+    マスク内の画素位置と、MIP段の表引き添字 (front << 8 | back) を前もって求めておき、
+    再合成ではマスク内の画素だけを表引きする。結果は composite_layers と一致する。
+    """
+
+    def __init__(self, layers: BlendLayers, clip_mask: np.ndarray | None = None):
+        """clip_mask を渡すと、その内側（非0）の画素だけを再合成の対象にする
+        （円形表示で外側が塗りつぶされる場合など）。
+        """
+        self.layers = layers
+        base = np.ascontiguousarray(layers.base_bg)
+        channels = base.shape[2] if base.ndim == 3 else 1
+        self._base = base
+        base_flat = base.reshape(-1, channels)
+        mip_flat = np.ascontiguousarray(layers.mip_layer).reshape(-1, channels)
+        vein_flat = np.ascontiguousarray(layers.vein_layer).reshape(-1, channels)
+
+        mask_mip, mask_vein = layers.mask_mip, layers.mask_vein
+        if clip_mask is not None:
+            mask_mip = cv.bitwise_and(mask_mip, clip_mask)
+            mask_vein = cv.bitwise_and(mask_vein, clip_mask)
+        self._sel_mip = np.flatnonzero(mask_mip)
+        self._idx_mip = mip_flat[self._sel_mip].astype(np.uint16) << 8
+        self._idx_mip |= base_flat[self._sel_mip]
+        self._sel_vein = np.flatnonzero(mask_vein)
+        self._front_vein = vein_flat[self._sel_vein].astype(np.uint16) << 8
+
+    def render(self, params: BlendParams) -> np.ndarray:
+        out = self._base.copy()
+        out_flat = out.reshape(-1, self._idx_mip.shape[1])
+        lut_mip = _blend_lut(float(np.clip(params.alpha_mid, 0.0, 1.0)))
+        lut_vein = _blend_lut(float(np.clip(params.alpha_fg, 0.0, 1.0)))
+        out_flat[self._sel_mip] = lut_mip[self._idx_mip]
+        out_flat[self._sel_vein] = lut_vein[self._front_vein | out_flat[self._sel_vein]]
+        return out
+
+
+def render_canonical(
+    bg_path: str,
+    mid_path: str,
+    fg_path: str,
+    params: BlendParams,
+    processing: ProcessingConfig | None = None,
+    mode_key: str | None = None,
+    mip_colormap_override: int | None = None,
+    size: tuple[int, int] | None = None,
+) -> np.ndarray:
+    """反転・回転なし（正規向き）の合成画像を返す。結果はグループ単位でキャッシュする。
+    size (幅, 高さ) を指定するとその作業解像度で合成する。
+    返す配列は書き込み不可（共有されるため）。
+    """
+    if processing is None:
+        processing = ProcessingConfig()
+    key = _composite_key(
+        (bg_path, mid_path, fg_path),
+        params,
+        processing,
+        mode_key,
+        mip_colormap_override,
+        size,
+    )
+
+    def _render() -> np.ndarray:
+        src = prepare_sources(
+            bg_path,
+            mid_path,
+            fg_path,
+            processing=processing,
+            mode_key=mode_key,
+            mip_colormap_override=mip_colormap_override,
+            size=size,
+        )
+        layers = build_layers(
+            src.bg,
+            src.mid,
+            src.fg,
+            processing,
+            mode_key,
+            mip_colormap_override,
+            mip_layer=src.mip_layer,
+            masks=src.masks,
+        )
+        return composite_layers(layers, params, sparse=processing.sparse_compositing)
+
+    return _composite_cache.get_or_create(key, _render)
+
+
+def get_composite_cache() -> ArrayLRUCache:
+    return _composite_cache
+
+
+def get_layer_cache() -> ArrayLRUCache:
+    return _layer_cache
+
+
+def blend_three(
+    bg_path: str,
+    mid_path: str,
+    fg_path: str,
+    params: BlendParams,
+    rotation_deg: float = 0.0,
+    flip_code: int | None = None,
+    processing: ProcessingConfig | None = None,
+    mode_key: str | None = None,
+    mip_colormap_override: int | None = None,
+    target_size: tuple[int, int] | None = None,
+    arena: BufferArena | None = None,
+) -> np.ndarray:
+    """3画像を重畳して BGR 画像を返す。
+    target_size (幅, 高さ) を指定すると表示サイズで描画する（入力を先に縮小）。
+    arena を渡すと中間画像と結果を arena のバッファへ書き込む（同じ作業解像度なら
+    新規確保なし）。その場合の戻り値は次に同じ arena で呼ぶまでに複製して使うこと。
+    既定ではスレッドごとのレイヤーグラフ（render_layered）で合成し、前回の呼び出しから
+    変わったレイヤーだけを作り直す。transform_last は正規向きの合成結果のキャッシュ、
+    tile_workers が2以上なら横帯並列で合成する。
+    """
+    # 設定
+    if processing is None:
+        processing = ProcessingConfig()
+
+    if processing.transform_last:
+        # 正規向きで合成済みの画像（キャッシュ）を使い、反転＋回転は仕上げで1回だけ
+        out = render_canonical(
+            bg_path,
+            mid_path,
+            fg_path,
+            params,
+            processing=processing,
+            mode_key=mode_key,
+            mip_colormap_override=mip_colormap_override,
+            size=group_working_size(bg_path, processing, rotation_deg, target_size),
+        )
+        return finish_output(
+            out, processing, rotation_deg=rotation_deg, flip_code=flip_code, arena=arena
+        )
+    if processing.tile_workers > 1:
+        # 画素ごとの段（肌色・ティント・マスク・合成・円形マスク）を横帯に分けて並列実行
+        src = prepare_sources(
+            bg_path,
+            mid_path,
+            fg_path,
+            rotation_deg=rotation_deg,
+            flip_code=flip_code,
+            processing=processing,
+            mode_key=mode_key,
+            mip_colormap_override=mip_colormap_override,
+            target_size=target_size,
+            arena=arena,
+        )
+        return composite_tiled(
+            src,
+            params,
+            processing,
+            mode_key,
+            mip_colormap_override,
+            workers=processing.tile_workers,
+            arena=arena,
+        )
+    return render_layered(
+        bg_path,
+        mid_path,
+        fg_path,
+        params,
+        rotation_deg=rotation_deg,
+        flip_code=flip_code,
+        processing=processing,
+        mode_key=mode_key,
+        mip_colormap_override=mip_colormap_override,
+        target_size=target_size,
+        arena=arena,
+    )
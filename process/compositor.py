@@ -0,0 +1,199 @@
+from dataclasses import dataclass, field, is_dataclass, replace
+from typing import Any, Callable
+
+import numpy as np
+
+
+@dataclass
+class GraphNode:
+    """レイヤーグラフの1ノード。inputs（パラメータ名または他ノード名）の値を引数に compute を呼ぶ。
+
+    cutoff=True のノードは、再計算した値が前回と等しければ（配列は同一オブジェクトなら）
+    下流を再計算させない（設定の一部を取り出すノードや、キャッシュ済みの素材を選ぶノード向け）。
+    結果を作業バッファへ上書きして作るノードでは使わないこと。
+    """
+
+    name: str
+    compute: Callable[..., Any]
+    inputs: tuple[str, ...] = ()
+    cutoff: bool = False
+
+
+@dataclass
+class OverlaySpec:
+    """背景の上に重ねる1レイヤー（画像ノード・マスクノード・alphaパラメータ）。
+    regions はこの段の合成範囲（矩形の列。None なら全体）を返すノード名。
+    """
+
+    name: str
+    image: str
+    mask: str
+    alpha: str
+    regions: str | None = None
+
+
+@dataclass
+class _NodeState:
+    value: Any = None
+    version: int = 0
+    input_versions: tuple | None = None
+    checked_pass: int = -1  # 入力の確認を済ませた評価パスの番号
+
+
+@dataclass
+class _StageState:
+    out: np.ndarray | None = None
+    key: tuple | None = None
+    version: int = 0
+
+
+def _same_value(a: Any, b: Any) -> bool:
+    # 配列は内容比較せず同一オブジェクトかで判定する
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return a is b
+    if isinstance(a, tuple) and isinstance(b, tuple):
+        return len(a) == len(b) and all(_same_value(x, y) for x, y in zip(a, b))
+    try:
+        return bool(a == b)
+    except Exception:
+        return a is b
+
+
+@dataclass
+class LayerGraph:
+    """入力の変化を追跡して、変わったレイヤーだけを作り直すN層コンポジタ。
+
+    パラメータ（素材パス・回転・alpha・カラーマップなど）は set() で与える。
+    各ノードは入力の値が変わったときだけ再計算し、合成は背景から順に段ごとに
+    結果を保持して、変化のあった段から上だけをブレンドし直す
+    （最上段の alpha だけが変わった場合はその段の1回のブレンドで済む）。
+    blend は composite_masked_u8 と同じ引数の段合成関数、regions は全段に共通の
+    合成範囲を返すノード名（None なら全体）。
+    """
+
+    nodes: list[GraphNode]
+    base: str
+    overlays: list[OverlaySpec]
+    blend: Callable[..., np.ndarray]
+    regions: str | None = None
+    params: dict[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self._nodes = {n.name: n for n in self.nodes}
+        if len(self._nodes) != len(self.nodes):
+            raise ValueError("ノード名が重複しています")
+        self.params = {k: self._snapshot(v) for k, v in self.params.items()}
+        self._param_versions: dict[str, int] = {k: 1 for k in self.params}
+        self._states: dict[str, _NodeState] = {}
+        self._stages = [_StageState() for _ in self.overlays]
+        self._recomputed: list[str] = []
+        self._pass = 0
+
+    @staticmethod
+    def _snapshot(value: Any) -> Any:
+        # 設定（dataclass）は複製して持つ。呼び出し側が同じオブジェクトをその場で
+        # 書き換えても、次の set() で変化として検出できる
+        if is_dataclass(value) and not isinstance(value, type):
+            return replace(value)
+        return value
+
+    def set(self, **params: Any) -> None:
+        """パラメータを更新する（値が変わったものだけが再計算の対象になる）。"""
+        for key, value in params.items():
+            if key in self.params and _same_value(self.params[key], value):
+                continue
+            self.params[key] = self._snapshot(value)
+            self._param_versions[key] = self._param_versions.get(key, 0) + 1
+
+    def _version(self, name: str) -> int:
+        if name in self._nodes:
+            self._evaluate(name)
+            return self._states[name].version
+        if name in self.params:
+            return self._param_versions[name]
+        raise KeyError(f"未定義のノードまたはパラメータです: {name}")
+
+    def _value(self, name: str) -> Any:
+        if name in self._nodes:
+            return self._evaluate(name)
+        return self.params[name]
+
+    def _evaluate(self, name: str) -> Any:
+        node = self._nodes[name]
+        state = self._states.setdefault(name, _NodeState())
+        if state.checked_pass == self._pass:
+            return state.value
+        input_versions = tuple(self._version(d) for d in node.inputs)
+        if state.input_versions != input_versions:
+            value = node.compute(*(self._value(d) for d in node.inputs))
+            state.input_versions = input_versions
+            unchanged = (
+                node.cutoff and state.version and _same_value(state.value, value)
+            )
+            if not unchanged:
+                state.value = value
+                state.version += 1
+                self._recomputed.append(name)
+        state.checked_pass = self._pass
+        return state.value
+
+    def get(self, name: str) -> Any:
+        """ノード（またはパラメータ）の現在の値を返す（必要なら再計算する）。"""
+        self._pass += 1
+        return self._value(name)
+
+    def render(self) -> np.ndarray:
+        """全レイヤーを合成した画像を返す。
+        戻り値はグラフ内のバッファ（次の render で上書きされうる）なので、保持する場合は複製すること。
+        """
+        self._recomputed = []
+        self._pass += 1
+        prev = self._evaluate(self.base)
+        prev_key = ("node", self.base, self._states[self.base].version)
+        regions = None
+        regions_version = None
+        if self.regions is not None:
+            regions = self._evaluate(self.regions)
+            regions_version = self._states[self.regions].version
+        for overlay, stage in zip(self.overlays, self._stages):
+            front = self._evaluate(overlay.image)
+            mask = self._evaluate(overlay.mask)
+            alpha = float(self._value(overlay.alpha))
+            stage_regions = None
+            stage_regions_version = None
+            if overlay.regions is not None:
+                stage_regions = self._evaluate(overlay.regions)
+                stage_regions_version = self._states[overlay.regions].version
+            key = (
+                prev_key,
+                self._states[overlay.image].version,
+                self._states[overlay.mask].version,
+                regions_version,
+                stage_regions_version,
+                alpha,
+            )
+            if stage.key != key:
+                if (
+                    stage.out is None
+                    or stage.out.shape != prev.shape
+                    or stage.out.dtype != prev.dtype
+                ):
+                    stage.out = np.empty_like(prev)
+                self.blend(
+                    prev,
+                    [(front, alpha, mask)],
+                    out=stage.out,
+                    regions=regions,
+                    stage_regions=[stage_regions],
+                )
+                stage.key = key
+                stage.version += 1
+                self._recomputed.append(overlay.name)
+            prev = stage.out
+            prev_key = ("stage", overlay.name, stage.version)
+        return prev
+
+    @property
+    def last_recomputed(self) -> tuple[str, ...]:
+        """直近の render で値が変わったノードと、ブレンドし直した段の名前"""
+        return tuple(self._recomputed)
@@ -1,7 +1,13 @@
 from typing import Iterable
+
+import cv2 as cv
+import numpy as np
 from PIL import Image, ImageDraw
 from domain.type import Stroke
 
+# cv.polylines に渡す座標の小数部ビット数（1/16画素の精度で描く）
+_POLY_SHIFT = 4
+
 
 def compose_strokes_on_image(
     base_img: Image.Image, strokes: Iterable[Stroke]
@@ -18,3 +24,49 @@ def compose_strokes_on_image(
             continue
         draw.line(s.points, fill=s.color, width=int(s.width))
     return img
+
+
+def rasterize_strokes(
+    strokes: Iterable[Stroke],
+    size: tuple[int, int],
+    source_size: tuple[int, int] | None = None,
+    antialias: bool = False,
+) -> np.ndarray:
+    """ストロークを1チャンネルのマーキングマスク (高さ, 幅) uint8 に描く（線上が255）。
+
+    Args:
+        strokes: 画像座標系の点列・太さ（色は使わない）
+        size: 出力マスクの (幅, 高さ)
+        source_size: 点列の座標系の (幅, 高さ)。size と異なれば座標と太さを拡大縮小する。
+            Noneなら size と同じ
+        antialias: True なら線の縁を LINE_AA で描く（0〜255の中間値を含む）
+
+    同じ太さのストロークはまとめて1回の cv.polylines で描く。
+    """
+    width, height = int(size[0]), int(size[1])
+    mask = np.zeros((height, width), dtype=np.uint8)
+    sx, sy = 1.0, 1.0
+    if source_size is not None:
+        sx, sy = width / source_size[0], height / source_size[1]
+    scale = (sx * (1 << _POLY_SHIFT), sy * (1 << _POLY_SHIFT))
+    polylines: dict[int, list[np.ndarray]] = {}
+    for s in strokes:
+        if not s.points or len(s.points) < 2:
+            continue
+        pts = np.asarray(s.points, dtype=np.float64) * scale
+        thickness = max(1, int(round(s.width * (sx + sy) / 2)))
+        polylines.setdefault(thickness, []).append(
+            np.round(pts).astype(np.int32).reshape(-1, 1, 2)
+        )
+    line_type = cv.LINE_AA if antialias else cv.LINE_8
+    for thickness, pts in polylines.items():
+        cv.polylines(
+            mask,
+            pts,
+            False,
+            255,
+            thickness=thickness,
+            lineType=line_type,
+            shift=_POLY_SHIFT,
+        )
+    return mask
@@ -0,0 +1,103 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+import numpy as np
+
+from domain.type import CacheStats
+
+
+# 既定の上限（2k×2k BGR が約12MBなので、数十グループ分を保持できる）
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def file_key(path: str) -> tuple[str, int, int]:
+    """ファイルの同一性キー（絶対パス, 更新時刻ns, サイズ）を返す。
+    ファイルが差し替えられた場合はキーが変わるため、古いキャッシュは参照されない。
+    """
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+
+class ArrayLRUCache:
+    """バイト数上限つきのLRUキャッシュ（ndarray専用）。
+
+    格納した配列は書き込み不可にして共有する（呼び出し側での破壊的変更を防ぐ）。
+    複数スレッドから参照されてもよいようにロックで保護する。
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = int(max_bytes)
+        self._entries: OrderedDict[Hashable, np.ndarray] = OrderedDict()
+        self._bytes_used = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> np.ndarray | None:
+        with self._lock:
+            arr = self._entries.get(key)
+            if arr is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return arr
+
+    def put(self, key: Hashable, arr: np.ndarray) -> np.ndarray:
+        """配列を格納して（書き込み不可の）格納済み配列を返す。
+        上限を超える単一配列は格納せずにそのまま返す。
+        """
+        arr.flags.writeable = False
+        nbytes = int(arr.nbytes)
+        if nbytes > self.max_bytes:
+            return arr
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes_used -= int(old.nbytes)
+            self._entries[key] = arr
+            self._bytes_used += nbytes
+            self._evict_locked()
+        return arr
+
+    def get_or_create(
+        self, key: Hashable, factory: Callable[[], np.ndarray]
+    ) -> np.ndarray:
+        arr = self.get(key)
+        if arr is not None:
+            return arr
+        return self.put(key, factory())
+
+    def set_max_bytes(self, max_bytes: int) -> None:
+        with self._lock:
+            self.max_bytes = int(max_bytes)
+            self._evict_locked()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes_used = 0
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._hits = self._misses = self._evictions = 0
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                entries=len(self._entries),
+                bytes_used=self._bytes_used,
+                max_bytes=self.max_bytes,
+            )
+
+    def _evict_locked(self) -> None:
+        while self._bytes_used > self.max_bytes and self._entries:
+            _, arr = self._entries.popitem(last=False)
+            self._bytes_used -= int(arr.nbytes)
+            self._evictions += 1
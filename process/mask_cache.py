@@ -0,0 +1,115 @@
+import hashlib
+import os
+import threading
+from typing import Callable
+
+import numpy as np
+
+from domain.type import CacheStats
+from process.image_cache import ArrayLRUCache, file_key
+
+
+# ビットパック済みマスクの上限（2k×2k で1枚約0.5MB）
+DEFAULT_MASK_MAX_BYTES = 64 * 1024 * 1024
+
+
+def pack_mask(mask: np.ndarray) -> np.ndarray:
+    """二値マスク (H, W) を1画素1ビットに詰める（非0を1とする）。"""
+    return np.packbits(mask > 0, axis=1)
+
+
+def unpack_mask(packed: np.ndarray, width: int) -> np.ndarray:
+    """pack_mask の逆変換。0/255 の uint8 マスク (H, W) を返す。"""
+    bits = np.unpackbits(packed, axis=1, count=width)
+    np.multiply(bits, 255, out=bits)
+    return bits
+
+
+class PackedMaskCache:
+    """素材ごとの二値マスクをビットパックして保持するキャッシュ。
+
+    メモリ上はLRU（ArrayLRUCache）で保持し、cache_dir を指定した場合は
+    .npy としてディスクにも保存して、次回起動時はしきい値処理を省略する。
+    キーは素材ファイルの同一性（file_key）と作業解像度なので、差し替えには追従する。
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MASK_MAX_BYTES):
+        self._memory = ArrayLRUCache(max_bytes=max_bytes)
+        self._disk_hits = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(path: str, shape: tuple[int, int], variant: tuple | None) -> tuple:
+        key = ("mask", file_key(path), tuple(shape))
+        return key if variant is None else key + (variant,)
+
+    @staticmethod
+    def _disk_path(cache_dir: str, key: tuple) -> str:
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(cache_dir, f"{digest}.npy")
+
+    def get_or_build(
+        self,
+        path: str,
+        shape: tuple[int, int],
+        build: Callable[[], np.ndarray],
+        cache_dir: str | None = None,
+        variant: tuple | None = None,
+    ) -> np.ndarray:
+        """path の素材から作ったマスク（0/255, 形状 shape）を返す。
+
+        Args:
+            path: マスクの元画像のパス
+            shape: 作業解像度でのマスク形状 (H, W)
+            build: キャッシュにない場合にマスクを作る関数
+            cache_dir: ディスクキャッシュの保存先（Noneならメモリのみ）
+            variant: 元画像の読み込み方（正規化の窓など。キーに含める）
+        """
+        key = self._key(path, shape, variant)
+        packed = self._memory.get(key)
+        if packed is None and cache_dir:
+            packed = self._load(cache_dir, key, shape)
+            if packed is not None:
+                packed = self._memory.put(key, packed)
+        if packed is None:
+            packed = self._memory.put(key, pack_mask(build()))
+            if cache_dir:
+                self._save(cache_dir, key, packed)
+        return unpack_mask(packed, shape[1])
+
+    def _load(
+        self, cache_dir: str, key: tuple, shape: tuple[int, int]
+    ) -> np.ndarray | None:
+        try:
+            packed = np.load(self._disk_path(cache_dir, key))
+        except (OSError, ValueError):
+            return None
+        if packed.shape != (shape[0], (shape[1] + 7) // 8):
+            return None
+        with self._lock:
+            self._disk_hits += 1
+        return packed
+
+    def _save(self, cache_dir: str, key: tuple, packed: np.ndarray) -> None:
+        # 書き込み途中のファイルを読まないよう、一時ファイルに書いてから置き換える
+        path = self._disk_path(cache_dir, key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                np.save(f, packed)
+            os.replace(tmp_path, path)
+        except OSError:
+            # ディスクキャッシュは任意（保存できなくてもメモリ上のマスクで続行する）
+            pass
+
+    @property
+    def disk_hits(self) -> int:
+        with self._lock:
+            return self._disk_hits
+
+    def clear(self) -> None:
+        self._memory.clear()
+
+    def stats(self) -> CacheStats:
+        return self._memory.stats()
@@ -0,0 +1,80 @@
+import cv2 as cv
+import numpy as np
+
+from domain.type import MarkingScore, ProcessingConfig
+from process.blend import build_masks, circle_mask_for, prepare_sources, transform_mask
+
+
+def reference_masks(
+    paths: tuple[str, str, str],
+    rotation_deg: float,
+    flip_code: int | None,
+    processing: ProcessingConfig,
+    mode_key: str | None,
+    mip_colormap_override: int | None,
+    target_size: tuple[int, int] | None,
+    image_size: tuple[int, int],
+) -> tuple[np.ndarray, np.ndarray]:
+    """提示した画像と同じ向き・大きさの正解マスク（MIP, 血管）を返す。
+
+    blend_three と同じ規則でマスク（build_masks）を作って反転・回転し、円形表示なら
+    円の外側を除いてから、保存画像のサイズ image_size (幅, 高さ) に合わせる。
+    縮小は面積平均で行い、少しでも血管・MIPがかかる画素を正解とする
+    （最近傍では1〜2pxの細い血管が途切れたり消えたりする）。
+    """
+    src = prepare_sources(
+        *paths,
+        rotation_deg=rotation_deg,
+        flip_code=flip_code,
+        processing=processing,
+        mode_key=mode_key,
+        mip_colormap_override=mip_colormap_override,
+        target_size=target_size,
+    )
+    masks = list(src.masks if src.masks is not None else build_masks(src.mid, src.fg))
+    if processing.transform_last:
+        masks = [
+            transform_mask(
+                m, flip_code, rotation_deg, keep_size=processing.circular_display
+            )
+            for m in masks
+        ]
+    size = (int(image_size[0]), int(image_size[1]))
+    result = []
+    for mask in masks:
+        if processing.circular_display:
+            mask = cv.bitwise_and(mask, circle_mask_for(mask))
+        if (mask.shape[1], mask.shape[0]) != size:
+            mask = cv.resize(mask, size, interpolation=cv.INTER_AREA)
+            _, mask = cv.threshold(mask, 0, 255, cv.THRESH_BINARY)
+        result.append(mask)
+    return result[0], result[1]
+
+
+def _distance_to(mask: np.ndarray) -> np.ndarray:
+    """各画素から mask の非0画素までのユークリッド距離（画素）"""
+    _, outside = cv.threshold(mask, 0, 255, cv.THRESH_BINARY_INV)
+    return cv.distanceTransform(outside, cv.DIST_L2, cv.DIST_MASK_PRECISE)
+
+
+def score_marking(
+    marking: np.ndarray, reference: np.ndarray, tolerance_px: float = 3.0
+) -> MarkingScore:
+    """描画マスクと正解マスク（同サイズ、非0が対象）を距離変換で比較する。
+
+    hit_rate は描画画素のうち正解から tolerance_px 以内の割合、coverage は正解画素の
+    うち描画から tolerance_px 以内の割合、mean_distance_px は描画画素から正解までの
+    平均距離。対象の画素がない値は None。
+    """
+    marked = marking > 0
+    ref = reference > 0
+    score = MarkingScore(marked_px=int(marked.sum()), reference_px=int(ref.sum()))
+    if score.marked_px and score.reference_px:
+        d_ref = _distance_to(reference)[marked]
+        score.hit_rate = float(np.mean(d_ref <= tolerance_px))
+        score.mean_distance_px = float(d_ref.mean())
+        d_mark = _distance_to(marking)[ref]
+        score.coverage = float(np.mean(d_mark <= tolerance_px))
+    elif score.reference_px:
+        score.coverage = 0.0
+    return score
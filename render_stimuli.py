@@ -0,0 +1,55 @@
+"""
+刺激画像の一括描画スクリプト
+assets の全グループ × 課題モード × 反転 × 回転角度（10度刻み）を、GUIを使わずに
+プロセスプールで描画し、出力ディレクトリへ画像とマニフェスト（manifest.csv）を書き出す
+
+実行方法（プロジェクト直下で）:
+    python render_stimuli.py [--out 出力先] [--workers 数] [--alpha-mid 値] [--alpha-fg 値]
+"""
+
+import argparse
+import os
+import time
+
+from domain.type import BlendParams
+from services.batch_service import enumerate_jobs, render_all
+
+
+def main():
+    """メイン関数"""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="刺激画像を一括描画する")
+    parser.add_argument("--assets", default=None, help="assetsルート（既定: ./assets）")
+    parser.add_argument(
+        "--out", default=os.path.join(base_dir, "stimuli"), help="出力ディレクトリ"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="ワーカープロセス数（既定: CPU数）"
+    )
+    parser.add_argument("--alpha-mid", type=float, default=0.3)
+    parser.add_argument("--alpha-fg", type=float, default=0.3)
+    args = parser.parse_args()
+
+    jobs = enumerate_jobs(args.assets)
+    if not jobs:
+        print("描画する画像グループが見つかりませんでした。")
+        return
+    print(f"{len(jobs)} 件を描画します（出力先: {args.out}）")
+
+    def _progress(done: int, total: int):
+        print(f"\r{done}/{total}", end="", flush=True)
+
+    t0 = time.perf_counter()
+    manifest_path = render_all(
+        jobs,
+        args.out,
+        params=BlendParams(alpha_mid=args.alpha_mid, alpha_fg=args.alpha_fg),
+        workers=args.workers,
+        progress=_progress,
+    )
+    print(f"\n完了: {time.perf_counter() - t0:.1f} 秒")
+    print(f"マニフェスト: {manifest_path}")
+
+
+if __name__ == "__main__":
+    main()
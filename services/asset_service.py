@@ -1,11 +1,21 @@
+import json
+import logging
 import os
 import random
-from typing import Tuple
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Tuple
 
-from domain.type import AssetsConfig
+from domain.type import AssetsConfig, PrefetchStats
 
 # Domain層は宣言のみ。既定値の実体はServices内で保持する。
 DEFAULT_CONFIG = AssetsConfig()
+# カタログの保存先（assetsルート直下）
+CATALOG_MANIFEST_NAME = ".asset_catalog.json"
+CATALOG_VERSION = 1
+
+_log = logging.getLogger(__name__)
 
 
 def _resolve_role_path(dir_path: str, role: str, config: AssetsConfig) -> str | None:
@@ -66,14 +76,302 @@ def list_available_groups(
     return groups
 
 
+class AssetCatalog:
+    """assetsルートの画像グループ一覧（1回作って保持し、マニフェストとして保存する）。
+
+    サブディレクトリごとに更新時刻(ns)と検出結果を持ち、refresh() では
+    ルートと各サブディレクトリの更新時刻だけを確認して、変わったディレクトリだけを
+    探索し直す（ファイルの追加・削除・改名でディレクトリの更新時刻が変わる）。
+    groups() / pick() はファイルシステムにアクセスしない。
+    """
+
+    def __init__(
+        self,
+        assets_root: str | None = None,
+        config: AssetsConfig | None = None,
+        manifest_path: str | None = None,
+    ):
+        if config is None:
+            config = DEFAULT_CONFIG
+        if assets_root is None:
+            assets_root = get_default_assets_root(config)
+        self.assets_root = os.path.abspath(assets_root)
+        self.config = config
+        self.manifest_path = manifest_path or os.path.join(
+            self.assets_root, CATALOG_MANIFEST_NAME
+        )
+        self._root_mtime_ns: int | None = None
+        # サブディレクトリ名（ルート直下のフォールバックは ""）→ (更新時刻ns, グループ)
+        self._dirs: dict[str, tuple[int, Tuple[str, str, str] | None]] = {}
+        self._groups: list[Tuple[str, str, str]] = []
+        self._lock = threading.Lock()
+        self._load_manifest()
+        self.refresh()
+
+    def groups(self) -> list[Tuple[str, str, str]]:
+        return list(self._groups)
+
+    def pick(self) -> Tuple[str, str, str] | None:
+        """グループを1つランダムに選ぶ（なければ None）"""
+        groups = self._groups
+        return random.choice(groups) if groups else None
+
+    def refresh(self) -> bool:
+        """更新時刻が変わったディレクトリだけを探索し直す。一覧が変わったら True。"""
+        with self._lock:
+            try:
+                root_mtime = os.stat(self.assets_root).st_mtime_ns
+            except OSError:
+                changed = bool(self._groups)
+                self._root_mtime_ns = None
+                self._dirs = {}
+                self._groups = []
+                return changed
+            if root_mtime != self._root_mtime_ns:
+                # ルートの更新時刻が変わったときだけ一覧を取り直す
+                with os.scandir(self.assets_root) as it:
+                    names = [e.name for e in it if e.is_dir()]
+            else:
+                names = [n for n in self._dirs if n]
+
+            dirs: dict[str, tuple[int, Tuple[str, str, str] | None]] = {}
+            for name in names:
+                sub = os.path.join(self.assets_root, name)
+                try:
+                    mtime = os.stat(sub).st_mtime_ns
+                except OSError:
+                    continue
+                cached = self._dirs.get(name)
+                if cached is not None and cached[0] == mtime:
+                    dirs[name] = cached
+                else:
+                    dirs[name] = (mtime, detect_group_paths(sub, self.config))
+            # ルート直下にも3画像がある場合のフォールバック
+            cached = self._dirs.get("")
+            if cached is not None and cached[0] == root_mtime:
+                dirs[""] = cached
+            else:
+                root_group = detect_group_paths(self.assets_root, self.config)
+                dirs[""] = (root_mtime, root_group)
+
+            changed = root_mtime != self._root_mtime_ns or dirs != self._dirs
+            self._root_mtime_ns = root_mtime
+            self._dirs = dirs
+            groups = [
+                group for name, (_, group) in sorted(dirs.items()) if name and group
+            ]
+            if dirs[""][1]:
+                groups.append(dirs[""][1])
+            self._groups = groups
+            if changed:
+                self._save_manifest()
+        return changed
+
+    def _load_manifest(self) -> None:
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if (
+            data.get("version") != CATALOG_VERSION
+            or data.get("root") != self.assets_root
+            or data.get("expected_names") != self.config.expected_names
+        ):
+            return
+        self._dirs = {
+            name: (int(entry["mtime_ns"]), tuple(entry["group"] or ()) or None)
+            for name, entry in data.get("dirs", {}).items()
+        }
+        self._root_mtime_ns = data.get("root_mtime_ns")
+
+    def _save_manifest(self) -> None:
+        data = {
+            "version": CATALOG_VERSION,
+            "root": self.assets_root,
+            "expected_names": self.config.expected_names,
+            "root_mtime_ns": self._root_mtime_ns,
+            "dirs": {
+                name: {"mtime_ns": mtime, "group": list(group) if group else None}
+                for name, (mtime, group) in self._dirs.items()
+            },
+        }
+        created = not os.path.exists(self.manifest_path)
+        # 書き込めない共有ディレクトリでもカタログ自体は使えるので、保存の失敗は無視する
+        try:
+            with open(self.manifest_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        except OSError:
+            return
+        if not created or os.path.dirname(self.manifest_path) != self.assets_root:
+            return
+        # マニフェストを新規作成するとルートの更新時刻が変わるので、取り直して保存し直す
+        # （上書きでは変わらない）。そうしないと次の refresh で毎回ルートを探索し直す
+        try:
+            root_mtime = os.stat(self.assets_root).st_mtime_ns
+        except OSError:
+            return
+        if root_mtime != self._root_mtime_ns:
+            self._root_mtime_ns = root_mtime
+            if "" in self._dirs:
+                self._dirs[""] = (root_mtime, self._dirs[""][1])
+            self._save_manifest()
+
+
+_catalogs: dict[tuple, AssetCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(
+    assets_root: str | None = None, config: AssetsConfig | None = None
+) -> AssetCatalog:
+    """assetsルートごとのカタログ（初回にマニフェストを読み、変わった部分だけ探索する）"""
+    if config is None:
+        config = DEFAULT_CONFIG
+    if assets_root is None:
+        assets_root = get_default_assets_root(config)
+    key = (os.path.abspath(assets_root), repr(config.expected_names))
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = AssetCatalog(assets_root, config)
+            _catalogs[key] = catalog
+        return catalog
+
+
+def refresh_catalog(
+    assets_root: str | None = None, config: AssetsConfig | None = None
+) -> bool:
+    """カタログを更新する（モード切替時など、試行の合間に呼ぶ）。一覧が変わったら True。"""
+    return get_catalog(assets_root, config).refresh()
+
+
 def pick_random_group(
     assets_root: str | None = None, config: AssetsConfig | None = None
 ) -> Tuple[str, str, str]:
-    groups = list_available_groups(assets_root, config)
-    if not groups:
+    """カタログからグループを1つ選ぶ（ファイルシステムにはアクセスしない）"""
+    group = get_catalog(assets_root, config).pick()
+    if group is None:
         if assets_root is None:
             assets_root = get_default_assets_root(config)
         raise FileNotFoundError(
             f"assetsルートに有効な画像グループが見つかりません: {assets_root}"
         )
-    return random.choice(groups)
+    return group
+
+
+class GroupPrefetcher:
+    """次の画像グループを前もって選び、ワーカースレッドでデコードしておく。
+
+    prefetch() で次のグループを選んで decode(paths) を依頼し、next_group() で
+    そのグループを受け取る（デコード中なら完了を待つ）。decode はデコード済み画像の
+    キャッシュに載せる関数（load_group など）で、描画はキャッシュから配列を受け取る。
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="group-prefetch"
+        )
+        self._pending: tuple[tuple, Tuple[str, str, str], Future] | None = None
+        self._hits = 0
+        self._misses = 0
+        self._discarded = 0
+        self._decoded = 0
+        self._decode_total_ms = 0.0
+        self._last_decode_ms: float | None = None
+        self._lock = threading.Lock()
+
+    def prefetch(
+        self,
+        decode: Callable[[Tuple[str, str, str]], object],
+        assets_root: str | None = None,
+        config: AssetsConfig | None = None,
+    ) -> None:
+        """先読みがなければ次のグループを選び、decode をワーカーで実行する。"""
+        key = (assets_root, None if config is None else repr(config.expected_names))
+        with self._lock:
+            if self._pending is not None:
+                if self._pending[0] == key:
+                    return
+                self._pending[2].cancel()
+                self._discarded += 1
+                self._pending = None
+            paths = get_catalog(assets_root, config).pick()
+            if paths is None:
+                return
+            future = self._executor.submit(self._decode, decode, paths)
+            self._pending = (key, paths, future)
+
+    def _decode(self, decode, paths: Tuple[str, str, str]) -> None:
+        t0 = time.perf_counter()
+        try:
+            decode(paths)
+        except Exception:
+            # 読めない画像は描画時にエラーとして通知される
+            return
+        elapsed = (time.perf_counter() - t0) * 1000.0
+        with self._lock:
+            self._decoded += 1
+            self._decode_total_ms += elapsed
+            self._last_decode_ms = elapsed
+        _log.debug("prefetch decode %s: %.1f ms", paths[0], elapsed)
+
+    def next_group(
+        self, assets_root: str | None = None, config: AssetsConfig | None = None
+    ) -> Tuple[str, str, str]:
+        """先読みしたグループを返す（なければ pick_random_group で選ぶ）。"""
+        key = (assets_root, None if config is None else repr(config.expected_names))
+        with self._lock:
+            pending, self._pending = self._pending, None
+            if pending is not None and pending[0] != key:
+                pending[2].cancel()
+                self._discarded += 1
+                pending = None
+            hit = pending is not None and pending[2].done()
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+        _log.debug(
+            "prefetch %s (%s)",
+            "hit" if hit else "miss",
+            "no prefetch" if pending is None else pending[1][0],
+        )
+        if pending is None:
+            return pick_random_group(assets_root, config)
+        pending[2].result()
+        return pending[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._pending is not None:
+                self._pending[2].cancel()
+                self._discarded += 1
+                self._pending = None
+
+    def stats(self) -> PrefetchStats:
+        with self._lock:
+            return PrefetchStats(
+                hits=self._hits,
+                misses=self._misses,
+                discarded=self._discarded,
+                last_decode_ms=self._last_decode_ms,
+                mean_decode_ms=(
+                    self._decode_total_ms / self._decoded if self._decoded else None
+                ),
+            )
+
+    def shutdown(self) -> None:
+        self.clear()
+        self._executor.shutdown(wait=False)
+
+
+_group_prefetcher: GroupPrefetcher | None = None
+
+
+def get_group_prefetcher() -> GroupPrefetcher:
+    """UIの試行選択で使う先読み（最初に使うときに作る）"""
+    global _group_prefetcher
+    if _group_prefetcher is None:
+        _group_prefetcher = GroupPrefetcher()
+    return _group_prefetcher
@@ -0,0 +1,228 @@
+import csv
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+
+import cv2 as cv
+from PIL import Image
+
+from domain.type import BlendParams, ModesConfig, ProcessingConfig, TrialSpec
+from process.asset_pack import write_pack
+from process.blend import blend_three, load_group
+from services.asset_service import list_available_groups
+from services.config_service import (
+    DEFAULT_MODES_CONFIG,
+    DEFAULT_PROCESSING_CONFIG,
+    FLIP_CANDIDATES,
+    ROTATION_CANDIDATES,
+)
+
+MANIFEST_NAME = "manifest.csv"
+MANIFEST_FIELDS = [
+    "file",
+    "group",
+    "mode",
+    "flip_code",
+    "rotation_deg",
+    "alpha_mid",
+    "alpha_fg",
+    "width",
+    "height",
+    "elapsed_ms",
+    "bg_path",
+    "mid_path",
+    "fg_path",
+]
+
+
+@dataclass(frozen=True)
+class StimulusJob:
+    """一括描画の1件（提示条件と、出力ディレクトリからの相対パス）"""
+
+    spec: TrialSpec
+    rel_path: str
+
+
+def group_name(paths: tuple[str, str, str]) -> str:
+    """画像グループの名前（3画像を含むディレクトリ名）"""
+    return os.path.basename(os.path.dirname(os.path.abspath(paths[0])))
+
+
+def enumerate_jobs(
+    assets_root: str | None = None,
+    modes_config: ModesConfig | None = None,
+    flips: list[int | None] | None = None,
+    rotations: list[float] | None = None,
+) -> list[StimulusJob]:
+    """全グループ × 課題モード × 反転 × 回転角度の組を列挙する。
+    練習モードは課題モードのどれかを毎回選ぶだけなので、課題モード（task*）だけを対象にする。
+    同じグループの条件が連続するように並べる（ワーカー内のデコードキャッシュが効く）。
+    """
+    if modes_config is None:
+        modes_config = DEFAULT_MODES_CONFIG
+    if flips is None:
+        flips = FLIP_CANDIDATES
+    if rotations is None:
+        rotations = ROTATION_CANDIDATES
+    modes = [m for m in modes_config.modes if m.key.startswith("task")]
+    jobs = []
+    for paths in sorted(list_available_groups(assets_root)):
+        group = group_name(paths)
+        for mode in modes:
+            for flip in flips:
+                for rotation in rotations:
+                    spec = TrialSpec(
+                        bg_path=paths[0],
+                        mid_path=paths[1],
+                        fg_path=paths[2],
+                        flip_code=flip,
+                        rotation_deg=float(rotation),
+                        ui_mode_key=mode.key,
+                        internal_mode=mode.key,
+                        mip_colormap_override=mode.mip_colormap_override,
+                    )
+                    flip_name = "none" if flip is None else str(flip)
+                    rel_path = os.path.join(
+                        mode.key,
+                        f"{group}_flip{flip_name}_rot{int(round(rotation)):03d}.png",
+                    )
+                    jobs.append(StimulusJob(spec=spec, rel_path=rel_path))
+    return jobs
+
+
+def render_stimulus(
+    job: StimulusJob,
+    out_dir: str,
+    params: BlendParams,
+    processing: ProcessingConfig,
+) -> dict:
+    """1件を描画して out_dir へ書き出し、マニフェストの1行を返す（ワーカープロセスで実行）。"""
+    spec = job.spec
+    t0 = time.perf_counter()
+    out_bgr = blend_three(
+        spec.bg_path,
+        spec.mid_path,
+        spec.fg_path,
+        params,
+        rotation_deg=spec.rotation_deg,
+        flip_code=spec.flip_code,
+        processing=processing,
+        mode_key=spec.internal_mode,
+        mip_colormap_override=spec.mip_colormap_override,
+    )
+    out_path = os.path.join(out_dir, job.rel_path)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    if not cv.imwrite(out_path, out_bgr):
+        raise OSError(f"画像を書き出せませんでした: {out_path}")
+    return {
+        "file": job.rel_path.replace(os.sep, "/"),
+        "group": group_name((spec.bg_path, spec.mid_path, spec.fg_path)),
+        "mode": spec.internal_mode,
+        "flip_code": "" if spec.flip_code is None else spec.flip_code,
+        "rotation_deg": spec.rotation_deg,
+        "alpha_mid": params.alpha_mid,
+        "alpha_fg": params.alpha_fg,
+        "width": out_bgr.shape[1],
+        "height": out_bgr.shape[0],
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000.0, 1),
+        "bg_path": spec.bg_path,
+        "mid_path": spec.mid_path,
+        "fg_path": spec.fg_path,
+    }
+
+
+def _render_chunk(
+    jobs: list[StimulusJob],
+    out_dir: str,
+    params: BlendParams,
+    processing: ProcessingConfig,
+) -> list[dict]:
+    return [render_stimulus(job, out_dir, params, processing) for job in jobs]
+
+
+def render_all(
+    jobs: list[StimulusJob],
+    out_dir: str,
+    params: BlendParams | None = None,
+    processing: ProcessingConfig | None = None,
+    workers: int | None = None,
+    progress=None,
+) -> str:
+    """jobs をプロセスプールで描画して out_dir に書き出し、マニフェスト（CSV）のパスを返す。
+
+    同じグループ・モードの条件はまとめて1つのワーカーへ渡す（デコード・マスク・MIPレイヤーの
+    キャッシュがワーカー内で再利用される）。progress を渡すと、まとまりが終わるたびに
+    progress(完了件数, 全件数) を呼ぶ。
+    """
+    if params is None:
+        params = BlendParams()
+    if processing is None:
+        processing = replace(DEFAULT_PROCESSING_CONFIG)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    os.makedirs(out_dir, exist_ok=True)
+
+    # グループ×モードごとのまとまり（enumerate_jobs の並びでは連続している）
+    chunks: list[list[StimulusJob]] = []
+    last_key = None
+    for job in jobs:
+        key = (job.spec.bg_path, job.spec.internal_mode)
+        if key != last_key:
+            chunks.append([])
+            last_key = key
+        chunks[-1].append(job)
+
+    rows: list[dict] = []
+    if workers <= 1:
+        for chunk in chunks:
+            rows.extend(_render_chunk(chunk, out_dir, params, processing))
+            if progress:
+                progress(len(rows), len(jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_render_chunk, chunk, out_dir, params, processing)
+                for chunk in chunks
+            ]
+            for future in futures:
+                rows.extend(future.result())
+                if progress:
+                    progress(len(rows), len(jobs))
+
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    with open(manifest_path, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=MANIFEST_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return manifest_path
+
+
+def build_asset_pack(
+    pack_dir: str,
+    size: tuple[int, int] | None = None,
+    assets_root: str | None = None,
+) -> tuple[str, int, int]:
+    """背景が size (幅, 高さ) のグループを元解像度のまま asset pack に書き出す。
+    パックの画素はPNGから読んだ場合（load_group で size を指定しない場合）と同じなので、
+    パックの有無で描画結果は変わらない。size を省略すると最も多い背景サイズにする。
+    背景サイズの違うグループはパックせず、従来どおりPNGから読む。
+    戻り値は (索引のパス, パックしたグループ数, 除いたグループ数)。
+    """
+    groups = sorted(list_available_groups(assets_root))
+    if not groups:
+        raise FileNotFoundError("パックする画像グループが見つかりません。")
+    sizes = {}
+    for paths in groups:
+        # ヘッダだけを読んでサイズを得る（デコードはパックへの書き出し時の1回だけ）
+        with Image.open(paths[0]) as img:
+            sizes[paths] = img.size
+    if size is None:
+        size = Counter(sizes.values()).most_common(1)[0][0]
+    size = (int(size[0]), int(size[1]))
+    packed = [paths for paths in groups if sizes[paths] == size]
+    if not packed:
+        raise FileNotFoundError(f"背景が {size[0]}x{size[1]} のグループがありません。")
+    index_path = write_pack(packed, pack_dir, size, lambda paths: load_group(*paths))
+    return index_path, len(packed), len(groups) - len(packed)
@@ -1,5 +1,6 @@
 import cv2 as cv
 import random
+import threading
 from domain.type import ProcessingConfig, DrawingConfig, ModesConfig, ModeSpec
 
 # Services層で既定値の実体を提供
@@ -19,8 +20,14 @@ DEFAULT_MODES_CONFIG = ModesConfig(
     ]
 )
 
+# 反転（なし/上下/左右/両方）と回転角度（10度刻み）の候補
+FLIP_CANDIDATES: list[int | None] = [None, 0, 1, -1]
+ROTATION_CANDIDATES: list[float] = [float(a) for a in range(0, 360, 10)]
+
 # UIモードと内部タスクのマッピング（固定）
 _ui_to_internal_task_mapping: dict[str, str] = {}
+# 先読みのワーカースレッドからも参照されるので、初期化は1回だけにする
+_mapping_lock = threading.Lock()
 
 
 def _initialize_task_mapping():
@@ -51,8 +58,9 @@ def get_internal_task_mode(ui_mode_key: str | None) -> str:
         return random.choice(["task1", "task2", "task3", "task4", "task5"])
 
     # マッピングが未初期化なら初期化
-    if not _ui_to_internal_task_mapping:
-        _initialize_task_mapping()
+    with _mapping_lock:
+        if not _ui_to_internal_task_mapping:
+            _initialize_task_mapping()
 
     # UIモードに対応する内部タスクを返す（存在しない場合はそのまま）
     return _ui_to_internal_task_mapping.get(ui_mode_key, ui_mode_key)
@@ -15,14 +15,17 @@ class MetricsService:
         }
         self._current_stroke_start_ts: float | None = None
 
-    def start_task(self) -> None:
-        """ "次へ行く"押下相当。計測をリセットし、起点時刻を記録。"""
+    def start_task(self, t0_ns: int | None = None) -> None:
+        """ "次へ行く"押下相当。計測をリセットし、起点時刻を記録。
+        t0_ns（time.perf_counter_ns() の値）を渡すとその時刻を起点にする。"""
         self._timing_record = {
             "start_latency_ms": None,
             "stroke_duration_ms": None,
         }
         self._current_stroke_start_ts = None
-        self._task_start_ts = time.perf_counter()
+        if t0_ns is None:
+            t0_ns = time.perf_counter_ns()
+        self._task_start_ts = t0_ns / 1e9
 
     def on_canvas_down(self) -> None:
         """キャンバス押下イベントで呼ぶ。開始点までの時間とストローク開始を記録。"""
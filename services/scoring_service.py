@@ -0,0 +1,175 @@
+import csv
+import json
+import os
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from pathlib import Path
+
+import cv2 as cv
+import numpy as np
+from PIL import Image
+
+from domain.type import ProcessingConfig, SaveRule
+from process.draw import rasterize_strokes
+from process.scoring import reference_masks, score_marking
+from services.stroke_service import load_stroke_log, log_to_strokes
+
+# 保存規則（画像と並べて保存したマスク・ログ・提示条件のファイル名）
+RULE = SaveRule()
+# 採点結果のファイル（セッションディレクトリ直下）
+TRIAL_SCORES_NAME = "scores_trials.csv"
+TASK_SCORES_NAME = "scores_tasks.csv"
+# 練習モードの保存先（save_with_canvas の "practice" サブディレクトリ）。
+# 練習の .trial.json の mode_key は毎回ランダムに選んだ課題なので、採点から除く
+PRACTICE_DIR_NAME = "practice"
+# 比較する正解マスク（any は MIP と血管の和）
+REFERENCES = ("mip", "vein", "any")
+SCORE_FIELDS = [
+    "marked_px",
+    "reference_px",
+    "hit_rate",
+    "coverage",
+    "mean_distance_px",
+]
+TRIAL_FIELDS = ["image_id", "task", "reference"] + SCORE_FIELDS
+TASK_FIELDS = [
+    "task",
+    "reference",
+    "trials",
+    "hit_rate_mean",
+    "coverage_mean",
+    "mean_distance_px_mean",
+]
+
+
+def find_trials(session_dir: Path) -> list[Path]:
+    """提示条件（.trial.json）が保存されている画像の一覧（練習モードの試行は除く）"""
+    return sorted(
+        p.with_name(p.name[: -len(RULE.trial_info_suffix)] + ".png")
+        for p in session_dir.rglob("*" + RULE.trial_info_suffix)
+        if PRACTICE_DIR_NAME not in p.relative_to(session_dir).parts[:-1]
+    )
+
+
+def _load_marking(image_path: Path, size: tuple[int, int]) -> np.ndarray | None:
+    """描画マスク（.mask.png、なければ .strokes.npz から描き直す）"""
+    stem = str(image_path.with_suffix(""))
+    mask_path = stem + RULE.mask_suffix
+    if os.path.isfile(mask_path):
+        # 保存と同じく PIL で読む（cv.imread は Windows で日本語を含むパスを読めない）
+        with Image.open(mask_path) as img:
+            return np.array(img.convert("L"))
+    log_path = stem + RULE.stroke_log_suffix
+    if os.path.isfile(log_path):
+        strokes = log_to_strokes(load_stroke_log(log_path))
+        return rasterize_strokes(strokes, size)
+    return None
+
+
+def score_trial(image_path: Path, tolerance_px: float = 3.0) -> list[dict]:
+    """1試行を採点し、正解マスクごとの行を返す（描画データがなければ空）。"""
+    stem = str(image_path.with_suffix(""))
+    with open(stem + RULE.trial_info_suffix, encoding="utf-8") as f:
+        info = json.load(f)
+    image_size = tuple(info["image_size"])
+    marking = _load_marking(image_path, image_size)
+    if marking is None:
+        return []
+    target_size = info.get("target_size")
+    mask_mip, mask_vein = reference_masks(
+        tuple(info["paths"]),
+        info["rotation_deg"],
+        info["flip_code"],
+        ProcessingConfig(**info["processing"]),
+        info["mode_key"],
+        info["mip_colormap_override"],
+        tuple(target_size) if target_size else None,
+        image_size,
+    )
+    refs = {
+        "mip": mask_mip,
+        "vein": mask_vein,
+        "any": cv.bitwise_or(mask_mip, mask_vein),
+    }
+    image_id = image_path.stem
+    if image_id.startswith("image_"):
+        image_id = image_id[len("image_") :]
+    rows = []
+    for name in REFERENCES:
+        score = score_marking(marking, refs[name], tolerance_px)
+        rows.append(
+            {
+                "image_id": image_id,
+                "task": info["mode_key"],
+                "reference": name,
+                **asdict(score),
+            }
+        )
+    return rows
+
+
+def _mean(values: list) -> float | None:
+    values = [v for v in values if v is not None]
+    return statistics.mean(values) if values else None
+
+
+def summarize_tasks(rows: list[dict]) -> list[dict]:
+    """試行ごとの行を課題（内部タスク）×正解マスクごとに平均する。"""
+    groups: dict[tuple, list[dict]] = {}
+    for r in rows:
+        groups.setdefault((r["task"], r["reference"]), []).append(r)
+    summary = []
+    for key in sorted(groups, key=str):
+        task, reference = key
+        items = groups[key]
+        summary.append(
+            {
+                "task": task,
+                "reference": reference,
+                "trials": len(items),
+                "hit_rate_mean": _mean([r["hit_rate"] for r in items]),
+                "coverage_mean": _mean([r["coverage"] for r in items]),
+                "mean_distance_px_mean": _mean(
+                    [r["mean_distance_px"] for r in items]
+                ),
+            }
+        )
+    return summary
+
+
+def score_session(session_dir: Path, tolerance_px: float = 3.0) -> dict:
+    """セッションディレクトリの全試行を採点し、試行別・課題別のCSVを書き出す。"""
+    rows = []
+    errors = 0
+    for image_path in find_trials(session_dir):
+        try:
+            rows.extend(score_trial(image_path, tolerance_px))
+        except Exception:
+            # 素材が見つからない試行などは飛ばして数だけ報告する
+            errors += 1
+    tasks = summarize_tasks(rows)
+    if rows:
+        _write_csv(session_dir / TRIAL_SCORES_NAME, TRIAL_FIELDS, rows)
+        _write_csv(session_dir / TASK_SCORES_NAME, TASK_FIELDS, tasks)
+    return {"session": session_dir.name, "tasks": tasks, "errors": errors}
+
+
+def score_sessions(
+    session_dirs: list[Path], tolerance_px: float = 3.0, workers: int | None = None
+) -> list[dict]:
+    """セッションをプロセスプールで並列に採点する（1セッション1タスク）。"""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(session_dirs) <= 1:
+        return [score_session(d, tolerance_px) for d in session_dirs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(score_session, d, tolerance_px) for d in session_dirs]
+        return [f.result() for f in futures]
+
+
+def _write_csv(path: Path, fieldnames: list[str], rows: list[dict]) -> None:
+    with open(path, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
@@ -0,0 +1,122 @@
+import time
+from array import array
+
+import numpy as np
+
+from domain.type import Stroke, StrokeLog
+
+
+class StrokeRecorder:
+    """キャンバス上のストロークを記録する。
+
+    全ストロークの点を1つの StrokeLog（x, y, 時刻, ストローク番号の配列）に追記する。
+    UIは extend() の戻り値（描画中のストロークの全座標）で折れ線アイテムを coords() 更新し、
+    保存時は to_strokes() / to_log() で Tk から読み戻さずにストロークを得る。
+    """
+
+    def __init__(self):
+        self._log = StrokeLog(t0_ns=time.perf_counter_ns())
+        # 描画中のストロークの座標（x0, y0, x1, y1, ... coords() にそのまま渡す）
+        self._active: array | None = None
+
+    def __len__(self) -> int:
+        return len(self._log.colors)
+
+    def begin(self, x: float, y: float, color: str, width: int) -> None:
+        """ストロークを開始する（押下位置）。"""
+        log = self._log
+        log.colors.append(color)
+        log.widths.append(int(width))
+        self._active = array("f")
+        self._append(x, y)
+
+    def extend(self, x: float, y: float) -> list[float] | None:
+        """描画中のストロークに点を追加し、そのストロークの全座標を返す（描画中でなければ None）。"""
+        if self._active is None:
+            return None
+        self._append(x, y)
+        return self._active.tolist()
+
+    def _append(self, x: float, y: float) -> None:
+        log = self._log
+        log.x.append(x)
+        log.y.append(y)
+        log.t_ns.append(time.perf_counter_ns())
+        log.stroke_id.append(len(log.colors) - 1)
+        self._active.append(x)
+        self._active.append(y)
+
+    def end(self) -> None:
+        self._active = None
+
+    def start_trial(self, t0_ns: int | None = None) -> None:
+        """記録を捨てて、t0_ns（省略時は現在時刻）を試行開始の時刻にする。"""
+        if t0_ns is None:
+            t0_ns = time.perf_counter_ns()
+        self._log = StrokeLog(t0_ns=int(t0_ns))
+        self._active = None
+
+    def clear(self) -> None:
+        """記録した点だけを捨てる（試行開始の時刻はそのまま）。"""
+        self.start_trial(self._log.t0_ns)
+
+    def to_log(self, origin: tuple[float, float] = (0.0, 0.0)) -> StrokeLog:
+        """origin（画像左上のキャンバス座標）基準の座標にした StrokeLog の複製"""
+        ox, oy = origin
+        log = self._log
+        return StrokeLog(
+            x=array("f", (v - ox for v in log.x)),
+            y=array("f", (v - oy for v in log.y)),
+            t_ns=array("q", log.t_ns),
+            stroke_id=array("I", log.stroke_id),
+            colors=list(log.colors),
+            widths=list(log.widths),
+            t0_ns=log.t0_ns,
+        )
+
+    def to_strokes(self, origin: tuple[float, float] = (0.0, 0.0)) -> list[Stroke]:
+        """2点以上のストロークを、origin 基準の Stroke にする。"""
+        return log_to_strokes(self.to_log(origin))
+
+
+def log_to_strokes(log: StrokeLog) -> list[Stroke]:
+    """StrokeLog をストロークごとの Stroke（2点以上のもの）に分ける"""
+    ids = np.frombuffer(log.stroke_id, dtype=np.uint32)
+    xs = np.frombuffer(log.x, dtype=np.float32)
+    ys = np.frombuffer(log.y, dtype=np.float32)
+    bounds = np.searchsorted(ids, np.arange(len(log.colors) + 1))
+    strokes = []
+    for i, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+        if stop - start < 2:
+            continue
+        points = list(zip(xs[start:stop].tolist(), ys[start:stop].tolist()))
+        strokes.append(Stroke(points=points, color=log.colors[i], width=log.widths[i]))
+    return strokes
+
+
+def save_stroke_log(log: StrokeLog, path: str) -> str:
+    """StrokeLog を .npz（圧縮）で保存する。時刻は試行開始からの経過ns（int64）。"""
+    np.savez_compressed(
+        path,
+        x=np.frombuffer(log.x, dtype=np.float32),
+        y=np.frombuffer(log.y, dtype=np.float32),
+        t_ns=np.frombuffer(log.t_ns, dtype=np.int64) - np.int64(log.t0_ns),
+        stroke_id=np.frombuffer(log.stroke_id, dtype=np.uint32),
+        colors=np.array(log.colors, dtype=str),
+        widths=np.array(log.widths, dtype=np.int16),
+    )
+    return path
+
+
+def load_stroke_log(path: str) -> StrokeLog:
+    """save_stroke_log で保存したログを読む（時刻は試行開始を0とした値になる）。"""
+    with np.load(path) as data:
+        return StrokeLog(
+            x=array("f", data["x"].astype(np.float32).tobytes()),
+            y=array("f", data["y"].astype(np.float32).tobytes()),
+            t_ns=array("q", data["t_ns"].astype(np.int64).tobytes()),
+            stroke_id=array("I", data["stroke_id"].astype(np.uint32).tobytes()),
+            colors=[str(c) for c in data["colors"]],
+            widths=[int(w) for w in data["widths"]],
+            t0_ns=0,
+        )
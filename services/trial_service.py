@@ -0,0 +1,221 @@
+import random
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import replace
+from functools import partial
+
+from domain.type import ModesConfig, PrerenderStats, ProcessingConfig, TrialSpec
+from process.blend import (
+    group_working_size,
+    load_group,
+    read_color_cached,
+    source_variant,
+)
+from services.asset_service import get_group_prefetcher
+from services.config_service import (
+    DEFAULT_MODES_CONFIG,
+    DEFAULT_PROCESSING_CONFIG,
+    FLIP_CANDIDATES,
+    ROTATION_CANDIDATES,
+    get_internal_task_mode,
+)
+from services.ui_actions import RenderedTrial, render_trial
+
+
+def _find_mode_spec(key: str | None, modes_config: ModesConfig):
+    for s in modes_config.modes:
+        if s.key == key:
+            return s
+    return None
+
+
+def _decode_group(
+    paths: tuple[str, str, str], target_size: tuple[int, int] | None = None
+) -> None:
+    """描画と同じ規則でグループを読み込み、デコード済み画像のキャッシュに載せる"""
+    processing = replace(DEFAULT_PROCESSING_CONFIG)
+    if not processing.render_at_display_size:
+        target_size = None
+    if target_size is not None and not processing.circular_display:
+        # 作業解像度は回転角度（試行ごとに選ぶ）で変わるので、元画像のデコードだけ済ませる
+        for path, role in zip(paths, ("ir", "mip", "vein")):
+            read_color_cached(path, source_variant(processing, role))
+        return
+    size = group_working_size(paths[0], processing, target_size=target_size)
+    load_group(*paths, size=size, processing=processing)
+
+
+def pick_next_trial(
+    ui_mode_key: str | None,
+    fallback_paths: tuple[str, str, str] | None = None,
+    modes_config: ModesConfig | None = None,
+    target_size: tuple[int, int] | None = None,
+) -> TrialSpec:
+    """次の試行の提示条件（画像グループ・反転・回転・内部タスク）をランダムに選ぶ。
+    画像グループが見つからない場合は fallback_paths を使う。
+    target_size は描画に使う表示サイズで、次のグループを同じ作業解像度で先読みする。
+    """
+    if modes_config is None:
+        modes_config = DEFAULT_MODES_CONFIG
+    prefetcher = get_group_prefetcher()
+    try:
+        bg, mid, fg = prefetcher.next_group()
+    except Exception:
+        if fallback_paths is None:
+            raise
+        bg, mid, fg = fallback_paths
+    # 次の試行のグループを選び、描画している間にデコードしておく
+    prefetcher.prefetch(partial(_decode_group, target_size=target_size))
+    # UIで選択された課題モードに対応する内部タスクを取得（固定マッピング）
+    internal_mode = get_internal_task_mode(ui_mode_key)
+    # 内部モードに応じたMIPカラーマップ上書き
+    spec = _find_mode_spec(internal_mode, modes_config)
+    return TrialSpec(
+        bg_path=bg,
+        mid_path=mid,
+        fg_path=fg,
+        flip_code=random.choice(FLIP_CANDIDATES),
+        rotation_deg=random.choice(ROTATION_CANDIDATES),
+        ui_mode_key=ui_mode_key,
+        internal_mode=internal_mode,
+        mip_colormap_override=spec.mip_colormap_override if spec else None,
+    )
+
+
+def _pick_and_render(
+    ui_mode_key: str | None,
+    alpha_mid: float,
+    alpha_fg: float,
+    fallback_paths: tuple[str, str, str] | None,
+    processing: ProcessingConfig,
+    target_size: tuple[int, int] | None,
+) -> RenderedTrial:
+    """次の試行を選んで描画する（TrialPrerenderer のワーカーで実行）"""
+    spec = pick_next_trial(ui_mode_key, fallback_paths, target_size=target_size)
+    return render_trial(spec, alpha_mid, alpha_fg, processing, target_size)
+
+
+class TrialPrerenderer:
+    """参加者が描画している間に、次の試行をワーカースレッドで描画しておくキュー。
+
+    UIスレッドは take() で描画済みの試行を受け取り、fill() で次の先読みを依頼する。
+    fill() はジョブを投入するだけで、試行の選択と描画はどちらもワーカーで行う。
+    先読み時点とモード・alpha・描画設定が変わっていた結果は破棄して同期描画する。
+    Tkの操作はUIスレッドに残し、ワーカーはPIL画像の生成までを行う。
+    """
+
+    def __init__(self, depth: int = 1):
+        self.depth = max(0, int(depth))
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="trial-prerender"
+        )
+        self._queue: deque[tuple[tuple, Future]] = deque()
+        self._hits = 0
+        self._misses = 0
+        self._discarded = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _condition_key(
+        ui_mode_key: str | None,
+        alpha_mid: float,
+        alpha_fg: float,
+        processing: ProcessingConfig,
+        target_size: tuple[int, int] | None,
+    ) -> tuple:
+        return (
+            ui_mode_key,
+            float(alpha_mid),
+            float(alpha_fg),
+            repr(processing),
+            target_size,
+        )
+
+    def fill(
+        self,
+        ui_mode_key: str | None,
+        alpha_mid: float,
+        alpha_fg: float,
+        fallback_paths: tuple[str, str, str] | None = None,
+        target_size: tuple[int, int] | None = None,
+    ) -> None:
+        """キューが depth 件になるまで次の試行の描画を依頼する。"""
+        processing = replace(DEFAULT_PROCESSING_CONFIG)
+        key = self._condition_key(
+            ui_mode_key, alpha_mid, alpha_fg, processing, target_size
+        )
+        with self._lock:
+            while len(self._queue) < self.depth:
+                # 試行の選択（先読み中のデコードの完了待ちを含む）もワーカーで行う
+                future = self._executor.submit(
+                    _pick_and_render,
+                    ui_mode_key,
+                    alpha_mid,
+                    alpha_fg,
+                    fallback_paths,
+                    processing,
+                    target_size,
+                )
+                self._queue.append((key, future))
+
+    def take(
+        self,
+        ui_mode_key: str | None,
+        alpha_mid: float,
+        alpha_fg: float,
+        fallback_paths: tuple[str, str, str] | None = None,
+        target_size: tuple[int, int] | None = None,
+    ) -> RenderedTrial:
+        """次の試行を返す。先読みが条件に合えばそれを（未完了なら完了を待って）使い、
+        なければUIスレッドで同期描画する。
+        """
+        processing = replace(DEFAULT_PROCESSING_CONFIG)
+        key = self._condition_key(
+            ui_mode_key, alpha_mid, alpha_fg, processing, target_size
+        )
+        future = None
+        with self._lock:
+            while self._queue:
+                queued_key, queued = self._queue.popleft()
+                if queued_key == key:
+                    future = queued
+                    break
+                queued.cancel()
+                self._discarded += 1
+        if future is not None:
+            try:
+                rendered = future.result()
+                with self._lock:
+                    self._hits += 1
+                return rendered
+            except Exception:
+                # 先読みの失敗は同期描画でやり直す（エラーはそちらで通知される）
+                pass
+        with self._lock:
+            self._misses += 1
+        return _pick_and_render(
+            ui_mode_key, alpha_mid, alpha_fg, fallback_paths, processing, target_size
+        )
+
+    def clear(self) -> None:
+        """先読み済みの試行をすべて破棄する（モード変更時など）。"""
+        with self._lock:
+            while self._queue:
+                _, future = self._queue.popleft()
+                future.cancel()
+                self._discarded += 1
+
+    def stats(self) -> PrerenderStats:
+        with self._lock:
+            return PrerenderStats(
+                queue_depth=len(self._queue),
+                max_depth=self.depth,
+                hits=self._hits,
+                misses=self._misses,
+                discarded=self._discarded,
+            )
+
+    def shutdown(self) -> None:
+        self.clear()
+        self._executor.shutdown(wait=False)
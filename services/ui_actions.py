@@ -1,18 +1,71 @@
 import os
 import csv
+import json
+import threading
+import time
+from dataclasses import asdict, dataclass, replace
 from datetime import datetime
 import tkinter as tk
 from tkinter import filedialog
+import cv2 as cv
 from PIL import Image
 
-from process.blend import blend_three
-from process.draw import compose_strokes_on_image
-from domain.type import BlendParams, SaveRule, Stroke, ProcessingConfig
+from process.arena import BufferArena
+from process.blend import (
+    Recompositor,
+    blend_three,
+    finish_output,
+    get_decoded_cache,
+    output_clip_mask,
+    prepare_layers,
+    render_layered,
+    resize_layers,
+)
+from process.draw import compose_strokes_on_image, rasterize_strokes
+from domain.type import (
+    ArenaStats,
+    BlendParams,
+    CacheStats,
+    ProcessingConfig,
+    SaveRule,
+    Stroke,
+    StrokeLog,
+    TrialSpec,
+)
+from services.stroke_service import save_stroke_log
 from services.user_service import get_current_user
-from services.config_service import get_internal_task_mode
+from services.config_service import DEFAULT_PROCESSING_CONFIG, get_internal_task_mode
 
 
-DEFAULT_PROCESSING_CONFIG = ProcessingConfig()
+@dataclass
+class _LiveBlendState:
+    """直近の試行の入力と、プレビュー用の alpha 再合成の前計算（遅延生成）"""
+
+    paths: tuple[str, str, str]
+    rotation_deg: float
+    flip_code: int | None
+    mode_key: str | None
+    mip_colormap_override: int | None
+    processing: ProcessingConfig  # 描画時点の設定のスナップショット
+    target_size: tuple[int, int] | None  # 表示サイズで描画した場合のキャンバスサイズ
+    output_size: tuple[int, int]  # 合成結果の (幅, 高さ)
+    preview: Recompositor | None = None
+    preview_size: tuple[int, int] | None = None  # 表示サイズ (幅, 高さ)
+    last_preview_ms: float | None = None
+    render_stats: ArenaStats | None = None  # 描画時の作業バッファ確保数・確保量の最大値
+
+
+_live_state: _LiveBlendState | None = None
+# 作業バッファはスレッドごとに持つ（UIスレッドと先読みスレッドで共有しない）
+_arena_local = threading.local()
+
+
+def _thread_arena() -> BufferArena:
+    arena = getattr(_arena_local, "arena", None)
+    if arena is None:
+        arena = BufferArena()
+        _arena_local.arena = arena
+    return arena
 
 
 def browse_path(var: tk.StringVar) -> None:
@@ -23,22 +76,36 @@ def browse_path(var: tk.StringVar) -> None:
         var.set(path)
 
 
-def blend_and_get_image(
-    bg_path: str,
-    mid_path: str,
-    fg_path: str,
-    alpha_mid: float,
-    alpha_fg: float,
-    rotation_deg: float = 0.0,
-    flip_code: int | None = None,
-    mode_key: str | None = None,
-    mip_colormap_override: int | None = None,
-) -> Image.Image:
+@dataclass
+class RenderedTrial:
+    """描画済みの試行（UIスレッド外で作り、activate_trial で表示対象にする）"""
+
+    spec: TrialSpec
+    params: BlendParams
+    image: Image.Image
+    live: _LiveBlendState
+
+
+def _render(
+    paths: tuple[str, str, str],
+    params: BlendParams,
+    rotation_deg: float,
+    flip_code: int | None,
+    mode_key: str | None,
+    mip_colormap_override: int | None,
+    processing: ProcessingConfig,
+    target_size: tuple[int, int] | None = None,
+) -> tuple[Image.Image, _LiveBlendState]:
+    """副作用なしで1試行を描画する（ワーカースレッドからも呼ばれる）。"""
+    bg_path, mid_path, fg_path = paths
+    if not processing.render_at_display_size:
+        target_size = None
     if not (
         os.path.isfile(bg_path) and os.path.isfile(mid_path) and os.path.isfile(fg_path)
     ):
         raise ValueError("3枚の画像パスを正しく指定してください。")
-    params = BlendParams(alpha_mid=float(alpha_mid), alpha_fg=float(alpha_fg))
+    arena = _thread_arena()
+    arena.reset_stats()
     out_bgr = blend_three(
         bg_path,
         mid_path,
@@ -46,14 +113,198 @@ def blend_and_get_image(
         params,
         rotation_deg=rotation_deg,
         flip_code=flip_code,
-        processing=DEFAULT_PROCESSING_CONFIG,
+        processing=processing,
+        mode_key=mode_key,
+        mip_colormap_override=mip_colormap_override,
+        target_size=target_size,
+        arena=arena,
+    )
+    live = _LiveBlendState(
+        paths=paths,
+        rotation_deg=rotation_deg,
+        flip_code=flip_code,
         mode_key=mode_key,
         mip_colormap_override=mip_colormap_override,
+        processing=processing,
+        target_size=target_size,
+        output_size=(out_bgr.shape[1], out_bgr.shape[0]),
+        render_stats=arena.stats(),
+    )
+    # out_bgr は arena のバッファなので、PIL画像（複製）にしてから返す
+    return _bgr_to_pil(out_bgr), live
+
+
+def blend_and_get_image(
+    bg_path: str,
+    mid_path: str,
+    fg_path: str,
+    alpha_mid: float,
+    alpha_fg: float,
+    rotation_deg: float = 0.0,
+    flip_code: int | None = None,
+    mode_key: str | None = None,
+    mip_colormap_override: int | None = None,
+    target_size: tuple[int, int] | None = None,
+) -> Image.Image:
+    """3画像を重畳してPIL画像を返し、alpha再合成の対象として記憶する。
+    target_size はキャンバスサイズ（render_at_display_size が有効な場合のみ使用）。
+    """
+    global _live_state
+    params = BlendParams(alpha_mid=float(alpha_mid), alpha_fg=float(alpha_fg))
+    image, _live_state = _render(
+        (bg_path, mid_path, fg_path),
+        params,
+        rotation_deg,
+        flip_code,
+        mode_key,
+        mip_colormap_override,
+        replace(DEFAULT_PROCESSING_CONFIG),
+        target_size,
     )
-    out_rgb = out_bgr[:, :, ::-1]
+    return image
+
+
+def render_trial(
+    spec: TrialSpec,
+    alpha_mid: float,
+    alpha_fg: float,
+    processing: ProcessingConfig | None = None,
+    target_size: tuple[int, int] | None = None,
+) -> RenderedTrial:
+    """試行を描画して返す。表示中の状態は変更しない（先読み用）。"""
+    if processing is None:
+        processing = replace(DEFAULT_PROCESSING_CONFIG)
+    params = BlendParams(alpha_mid=float(alpha_mid), alpha_fg=float(alpha_fg))
+    image, live = _render(
+        (spec.bg_path, spec.mid_path, spec.fg_path),
+        params,
+        spec.rotation_deg,
+        spec.flip_code,
+        spec.internal_mode,
+        spec.mip_colormap_override,
+        processing,
+        target_size,
+    )
+    return RenderedTrial(spec=spec, params=params, image=image, live=live)
+
+
+def activate_trial(rendered: RenderedTrial) -> Image.Image:
+    """描画済みの試行を表示対象にする（以降の alpha 再合成の対象になる）。"""
+    global _live_state
+    _live_state = rendered.live
+    return rendered.image
+
+
+def _bgr_to_pil(out_bgr) -> Image.Image:
+    out_rgb = cv.cvtColor(out_bgr, cv.COLOR_BGR2RGB)
     return Image.fromarray(out_rgb)
 
 
+def _display_size(img_w: int, img_h: int, canvas_w: int, canvas_h: int):
+    """resize_for_canvas と同じ規則で表示サイズを求める"""
+    scale = min(canvas_w / img_w, canvas_h / img_h)
+    if scale < 1.0:
+        return int(img_w * scale), int(img_h * scale), scale
+    return img_w, img_h, 1.0
+
+
+def _prepare_live_layers(state: _LiveBlendState):
+    return prepare_layers(
+        *state.paths,
+        rotation_deg=state.rotation_deg,
+        flip_code=state.flip_code,
+        processing=state.processing,
+        mode_key=state.mode_key,
+        mip_colormap_override=state.mip_colormap_override,
+        target_size=state.target_size,
+    )
+
+
+def reblend_preview(
+    alpha_mid: float, alpha_fg: float, canvas_w: int, canvas_h: int
+) -> Image.Image | None:
+    """直近の試行を、表示解像度のレイヤーから alpha だけ変えて再合成する（スライダー操作用）。
+    読み込み・変換・着色・マスク生成は初回のみで、以降は最終合成だけを行う。
+    戻り値は resize_for_canvas 後と同じサイズ。直近の試行がなければ None。
+    """
+    state = _live_state
+    if state is None:
+        return None
+    out_w, out_h = state.output_size
+    disp_w, disp_h, scale = _display_size(out_w, out_h, canvas_w, canvas_h)
+    if state.preview is None or state.preview_size != (disp_w, disp_h):
+        layers = _prepare_live_layers(state)
+        if scale < 1.0:
+            layer_h, layer_w = layers.base_bg.shape[:2]
+            if state.processing.transform_last:
+                # 回転は合成後に行うため、レイヤーは同じ倍率で縮小しておく
+                layer_size = (int(layer_w * scale), int(layer_h * scale))
+            else:
+                layer_size = (disp_w, disp_h)
+            layers = resize_layers(layers, *layer_size)
+        state.preview = Recompositor(
+            layers, clip_mask=output_clip_mask(layers, state.processing)
+        )
+        state.preview_size = (disp_w, disp_h)
+
+    t0 = time.perf_counter()
+    params = BlendParams(alpha_mid=float(alpha_mid), alpha_fg=float(alpha_fg))
+    out = finish_output(
+        state.preview.render(params),
+        state.processing,
+        rotation_deg=state.rotation_deg,
+        flip_code=state.flip_code,
+    )
+    if (out.shape[1], out.shape[0]) != (disp_w, disp_h):
+        # 回転後の丸め誤差で1px程度ずれる場合は表示サイズへ合わせる
+        out = cv.resize(out, (disp_w, disp_h), interpolation=cv.INTER_AREA)
+    state.last_preview_ms = (time.perf_counter() - t0) * 1000.0
+    return _bgr_to_pil(out)
+
+
+def reblend_last(alpha_mid: float, alpha_fg: float) -> Image.Image | None:
+    """直近の試行を元解像度で alpha だけ変えて再合成する（スライダー確定時）。
+    このスレッドのレイヤーグラフで描画するため、同じ試行なら変わった段の合成だけを行う。
+    結果は同じ alpha で blend_and_get_image した場合と一致する。
+    """
+    state = _live_state
+    if state is None:
+        return None
+    params = BlendParams(alpha_mid=float(alpha_mid), alpha_fg=float(alpha_fg))
+    out = render_layered(
+        *state.paths,
+        params,
+        rotation_deg=state.rotation_deg,
+        flip_code=state.flip_code,
+        processing=state.processing,
+        mode_key=state.mode_key,
+        mip_colormap_override=state.mip_colormap_override,
+        target_size=state.target_size,
+        arena=_thread_arena(),
+    )
+    return _bgr_to_pil(out)
+
+
+def get_last_preview_ms() -> float | None:
+    """直近のプレビュー再合成にかかった時間(ms)。"""
+    return _live_state.last_preview_ms if _live_state else None
+
+
+def get_last_render_stats() -> ArenaStats | None:
+    """直近の試行を描画したときの作業バッファの新規確保数と最大常駐メモリ。"""
+    return _live_state.render_stats if _live_state else None
+
+
+def get_image_cache_stats() -> CacheStats:
+    """デコード済み画像キャッシュのヒット/ミス/追い出し回数などを返す。"""
+    return get_decoded_cache().stats()
+
+
+def set_image_cache_budget(max_bytes: int) -> None:
+    """デコード済み画像キャッシュの上限バイト数を変更する。"""
+    get_decoded_cache().set_max_bytes(max_bytes)
+
+
 def resize_for_canvas(
     pil_img: Image.Image, canvas_w: int, canvas_h: int
 ) -> Image.Image:
@@ -67,9 +318,16 @@ def resize_for_canvas(
 
 
 def save_with_canvas(
-    base_img: Image.Image, strokes: list[Stroke], mode_key: str | None = None
+    base_img: Image.Image,
+    strokes: list[Stroke],
+    mode_key: str | None = None,
+    stroke_log: StrokeLog | None = None,
 ) -> str | None:
-    """キャンバス描画を合成して、Domain規則に従って保存する。"""
+    """キャンバス描画を合成して、Domain規則に従って保存する。
+    描画した線だけの二値マスク（画像と同じサイズ）を .mask.png として並べて保存する。
+    stroke_log を渡すと、点ごとの座標・時刻を画像と同じ名前の .strokes.npz に保存する。
+    表示中の試行の提示条件（画像グループ・反転・回転・描画設定）は .trial.json に保存する。
+    """
     if base_img is None:
         return None
 
@@ -109,9 +367,35 @@ def save_with_canvas(
     out_path = os.path.join(out_dir, filename)
 
     composed.save(out_path)
+    stem = os.path.splitext(out_path)[0]
+    mask = rasterize_strokes(strokes, base_img.size)
+    # cv.imwrite は Windows で日本語を含むパスに書けないため、合成画像と同じく PIL で保存する
+    Image.fromarray(mask).save(stem + rule.mask_suffix)
+    if stroke_log is not None:
+        save_stroke_log(stroke_log, stem + rule.stroke_log_suffix)
+    if _live_state is not None:
+        _write_trial_info(stem + rule.trial_info_suffix, _live_state, base_img.size)
     return out_path
 
 
+def _write_trial_info(
+    path: str, state: _LiveBlendState, image_size: tuple[int, int]
+) -> None:
+    info = {
+        "paths": list(state.paths),
+        "rotation_deg": state.rotation_deg,
+        "flip_code": state.flip_code,
+        "mode_key": state.mode_key,
+        "mip_colormap_override": state.mip_colormap_override,
+        "processing": asdict(state.processing),
+        "target_size": state.target_size,
+        "output_size": list(state.output_size),
+        "image_size": list(image_size),
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(info, f, ensure_ascii=False, indent=2)
+
+
 def append_metrics_for_image(image_path: str, rows: list[dict]) -> str:
     """同じ保存ディレクトリに metrics.csv を作成/追記する。
     rows: {mode, start_latency_ms, stroke_duration_ms, rotation_deg}